@@ -23,6 +23,9 @@ CREATE TABLE Medicamento (
     idtAtivo BOOLEAN DEFAULT TRUE
 );
 
+-- Busca por nome e dosagem (sem diferenciar maiúsculas) usada na importação do catálogo
+CREATE INDEX idx_medicamento_nome_dosagem ON Medicamento (lower(nomMedicamento), lower(coalesce(desDosagem, '')));
+
 -- Inserir remédios do seu protótipo
 INSERT INTO Medicamento (nomMedicamento, desDosagem) VALUES 
 ('Paracetamol', '750mg'),
@@ -39,18 +42,88 @@ CREATE TABLE Solicitacao (
     datSolicitacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     desStatus VARCHAR(20) DEFAULT 'EM ANALISE',
     txtObservacao TEXT,
+    codAnalistaCPF CHAR(11),            -- analista que reservou (ou avaliou) a solicitação
+    datReservaAte TIMESTAMP,            -- reserva vencida volta para a fila
     
     FOREIGN KEY (codUsuarioCPF) REFERENCES Usuario(codUsuarioCPF),
     FOREIGN KEY (idMedicamento) REFERENCES Medicamento(idMedicamento)
 );
 
+-- Paginação por keyset da fila (listar_solicitacoes)
+CREATE INDEX idx_solicitacao_data_id ON Solicitacao (datSolicitacao DESC, idSolicitacao DESC);
+
+-- Filtros da fila: só as solicitações em aberto (a fila do analista não cresce com o histórico)
+CREATE INDEX idx_solicitacao_em_analise ON Solicitacao (datSolicitacao DESC, idSolicitacao DESC)
+    WHERE desStatus = 'EM ANALISE';
+CREATE INDEX idx_solicitacao_status_data ON Solicitacao (desStatus, datSolicitacao DESC, idSolicitacao DESC);
+CREATE INDEX idx_solicitacao_medicamento_data ON Solicitacao (idMedicamento, datSolicitacao DESC, idSolicitacao DESC);
+-- também atende minhas_solicitacoes (WHERE codUsuarioCPF = ... ORDER BY datSolicitacao DESC)
+CREATE INDEX idx_solicitacao_cpf_data ON Solicitacao (codUsuarioCPF, datSolicitacao DESC, idSolicitacao DESC);
+
+-- Eventos em tempo real (ver eventos.py): cada solicitação criada ou com status
+-- alterado gera um NOTIFY, entregue aos ouvintes quando a transação faz commit.
+-- O id vem de uma sequência para ser o mesmo em todos os processos (Last-Event-ID).
+DROP SEQUENCE IF EXISTS evento_solicitacao_seq;
+CREATE SEQUENCE evento_solicitacao_seq;
+
+CREATE OR REPLACE FUNCTION notifica_solicitacao() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('solicitacoes', json_build_object(
+        'id', nextval('evento_solicitacao_seq'),
+        'evento', CASE WHEN TG_OP = 'INSERT' THEN 'CRIADA' ELSE 'AVALIADA' END,
+        'cpf', NEW.codUsuarioCPF,
+        'protocolo', NEW.idSolicitacao,
+        'cidadao', (SELECT nomUsuario FROM Usuario WHERE codUsuarioCPF = NEW.codUsuarioCPF),
+        'medicamento', (SELECT nomMedicamento FROM Medicamento WHERE idMedicamento = NEW.idMedicamento),
+        'data', to_char(NEW.datSolicitacao, 'DD/MM/YYYY'),
+        'status', NEW.desStatus
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER solicitacao_criada AFTER INSERT ON Solicitacao
+    FOR EACH ROW EXECUTE FUNCTION notifica_solicitacao();
+CREATE TRIGGER solicitacao_avaliada AFTER UPDATE OF desStatus ON Solicitacao
+    FOR EACH ROW WHEN (OLD.desStatus IS DISTINCT FROM NEW.desStatus)
+    EXECUTE FUNCTION notifica_solicitacao();
+
 -- 6. CRIAR TABELA DE DOCUMENTOS (Para os anexos)
 DROP TABLE IF EXISTS DocumentoSolicitacao CASCADE;
 CREATE TABLE DocumentoSolicitacao (
     idDocumento SERIAL PRIMARY KEY,
     idSolicitacao INTEGER NOT NULL,
     nomArquivo VARCHAR(100),
-    desCaminho VARCHAR(255),
+    desCaminho VARCHAR(255),            -- relativo ao diretório de documentos, pelo hash do conteúdo
+    desTipo VARCHAR(50),
+    qtdBytes BIGINT,
+    desHash CHAR(64),                   -- SHA-256: a mesma receita é gravada uma só vez
     
     FOREIGN KEY (idSolicitacao) REFERENCES Solicitacao(idSolicitacao)
-);
\ No newline at end of file
+);
+
+CREATE INDEX idx_documento_solicitacao ON DocumentoSolicitacao (idSolicitacao);
+CREATE INDEX idx_documento_hash ON DocumentoSolicitacao (desHash);   -- varredura de órfãos
+-- 7. FILA DE TAREFAS EM SEGUNDO PLANO (ver tarefas.py e trabalhador.py)
+-- Gravada na mesma transação que a solicitação: só existe se ela existir.
+-- datDisponivel é quando a tarefa pode ser pega: PENDENTE aguardando (ou em
+-- backoff) ou EXECUTANDO com o lease vencido (trabalhador caiu). FALHA é a
+-- fila de mortas: esgotou as tentativas e espera intervenção.
+DROP TABLE IF EXISTS Tarefa CASCADE;
+CREATE TABLE Tarefa (
+    idTarefa BIGSERIAL PRIMARY KEY,
+    desTipo VARCHAR(50) NOT NULL,
+    jsonDados JSONB NOT NULL DEFAULT '{}',
+    desStatus VARCHAR(20) NOT NULL DEFAULT 'PENDENTE'
+        CHECK (desStatus IN ('PENDENTE', 'EXECUTANDO', 'CONCLUIDA', 'FALHA')),
+    qtdTentativas INTEGER NOT NULL DEFAULT 0,
+    datDisponivel TIMESTAMP NOT NULL DEFAULT now(),
+    txtErro TEXT,
+    datCriacao TIMESTAMP NOT NULL DEFAULT now(),
+    datConclusao TIMESTAMP
+);
+
+-- Só as tarefas vivas: a fila não cresce com o histórico de concluídas
+CREATE INDEX idx_tarefa_fila ON Tarefa (desTipo, datDisponivel, idTarefa)
+    WHERE desStatus IN ('PENDENTE', 'EXECUTANDO');
+CREATE INDEX idx_tarefa_falha ON Tarefa (desTipo, datConclusao) WHERE desStatus = 'FALHA';
@@ -1,21 +1,37 @@
 # app.py
 from flask import Flask
 from flask_cors import CORS
-from routes import cargo_bp, login_bp
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import PROXY
+from routes import cargo_bp, login_bp, metricas_bp
 from routes.solicitacoes_routes import solicitacoes_bp  # adicione isto
+from replicas import registraJanelaPrimario
+from sessao import registraSessao
 
 app = Flask(__name__)
 
+# Atrás de proxy reverso: remote_addr (usado no limite de login por IP) passa a
+# ser o cliente informado no X-Forwarded-For pelos proxies confiáveis
+if PROXY["saltos"]:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY["saltos"], x_proto=PROXY["saltos"])
+
 
 CORS(app, resources={r"/api/*": {"origins": [
     "http://localhost:5173",
     "http://probable-guide-rpv9wgwp5j5fpgvw-5173.app.github.dev"
-]}})
+], "expose_headers": ["X-Proximo-Cursor"]}})
 
 # Registrando as rotas
 app.register_blueprint(cargo_bp, url_prefix="/api")
 app.register_blueprint(login_bp, url_prefix="/api")
 app.register_blueprint(solicitacoes_bp, url_prefix="/api")  # registre aqui
+app.register_blueprint(metricas_bp, url_prefix="/api")
+
+# Após uma escrita, o mesmo cliente lê do primário por alguns segundos
+registraJanelaPrimario(app)
+
+# Token de sessão (Authorization: Bearer) validado sem ir ao banco
+registraSessao(app)
 
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=5000, debug=True)
@@ -0,0 +1,60 @@
+# benchmarks/bench_async.py
+# Compara a vazão do resumo do dashboard (duas contagens independentes)
+# no Db síncrono (consultas em série) e no DbAsync (consultas em paralelo).
+# Precisa do banco configurado em config.DB_CONFIG.
+#
+#   cd backend
+#   python -m benchmarks.bench_async [requisicoes] [concorrencia]
+import asyncio
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import Flask
+
+from db import Db, Mode
+from db_async import DbAsync
+
+SQL_TOTAL = "SELECT COUNT(*) FROM Solicitacao"
+SQL_STATUS = "SELECT desStatus, COUNT(*) FROM Solicitacao GROUP BY desStatus"
+
+app = Flask(__name__)
+
+
+def resumoSincrono():
+    with app.app_context():
+        db = Db(debug=False)
+        db.execSql(SQL_TOTAL, mode=Mode.SELECT)
+        db.execSql(SQL_STATUS, mode=Mode.SELECT)
+
+
+def resumoAssincrono():
+    # como o Flask faz com uma view async: um loop por requisição
+    async def resumo():
+        await asyncio.gather(
+            DbAsync(debug=False).execSql(SQL_TOTAL, mode=Mode.SELECT),
+            DbAsync(debug=False).execSql(SQL_STATUS, mode=Mode.SELECT))
+
+    with app.app_context():
+        asyncio.run(resumo())
+
+
+def mede(funcao, requisicoes, concorrencia):
+    with ThreadPoolExecutor(concorrencia) as executor:
+        list(executor.map(lambda _: funcao(), range(concorrencia)))  # aquecimento
+        inicio = time.perf_counter()
+        list(executor.map(lambda _: funcao(), range(requisicoes)))
+        return requisicoes / (time.perf_counter() - inicio)
+
+
+def main():
+    requisicoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    concorrencia = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    print(f"{requisicoes} requisições, {concorrencia} threads")
+    print(f"síncrono  : {mede(resumoSincrono, requisicoes, concorrencia):8.1f} req/s")
+    print(f"assíncrono: {mede(resumoAssincrono, requisicoes, concorrencia):8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+# benchmarks/bench_busca.py
+# Latência do autocomplete (IndiceMedicamentos.busca) com um catálogo
+# sintético, comparada com a varredura linear da lista. Não precisa de banco.
+#
+#   cd backend
+#   python -m benchmarks.bench_busca [medicamentos] [consultas]
+import random
+import sys
+import time
+
+from indice import IndiceMedicamentos
+from util import normaliza
+
+BASES = ["Insulina", "Dipirona", "Losartana", "Metformina", "Omeprazol", "Amoxicilina",
+         "Paracetamol", "Sinvastatina", "Atenolol", "Levotiroxina", "Salbutamol", "Ibuprofeno"]
+FORMAS = ["Comprimido", "Cápsula", "Solução", "Xarope", "Injetável", "Spray"]
+DOSES = ["5mg", "10mg", "20mg", "50mg", "100mg", "500mg", "100UI/ml", "200mcg"]
+
+
+def catalogoSintetico(qtd):
+    aleatorio = random.Random(42)
+    return [{
+        "id": i,
+        "nome": f"{aleatorio.choice(BASES)} {aleatorio.choice(FORMAS)} {i:05d}",
+        "dosagem": aleatorio.choice(DOSES),
+    } for i in range(qtd)]
+
+
+def varredura(itens, texto, limite=10):
+    termos = normaliza(texto).split()
+    achados = [item for item in itens
+               if all(any(p.startswith(t) for p in normaliza(f"{item['nome']} {item['dosagem']}").split())
+                      for t in termos)]
+    return achados[:limite]
+
+
+def percentis(tempos):
+    tempos = sorted(tempos)
+    return tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.99)]
+
+
+def mede(funcao, consultas):
+    tempos = []
+    for texto in consultas:
+        inicio = time.perf_counter()
+        funcao(texto)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return percentis(tempos)
+
+
+def main():
+    qtd = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    qtdConsultas = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    itens = catalogoSintetico(qtd)
+    indice = IndiceMedicamentos()
+    inicio = time.perf_counter()
+    indice.reconstroi(itens)
+    print(f"{qtd} medicamentos, índice montado em {(time.perf_counter() - inicio) * 1000:.0f} ms")
+
+    aleatorio = random.Random(7)
+    consultas = []
+    for _ in range(qtdConsultas):
+        base = aleatorio.choice(BASES + FORMAS)
+        texto = base[:aleatorio.randint(2, len(base))]
+        if aleatorio.random() < 0.3:
+            texto += " " + aleatorio.choice(DOSES)[:2]
+        consultas.append(texto)
+
+    # o pior caso: várias palavras comuns (faixas grandes) que não aparecem juntas
+    # ou com uma palavra que não existe, e prefixos curtos que casam com muito
+    semResultado = []
+    curtas = []
+    for _ in range(qtdConsultas):
+        base = normaliza(aleatorio.choice(BASES + FORMAS))
+        semResultado.append(aleatorio.choice([
+            f"{base} zz",
+            f"{base[:2]} {aleatorio.choice(FORMAS)[:2]} 999",
+            f"{aleatorio.choice(FORMAS)} {aleatorio.choice(FORMAS)} {aleatorio.choice(DOSES)}",
+        ]))
+        curtas.append(" ".join(aleatorio.choice("abcdilmops") + aleatorio.choice("aeiou0")
+                               for _ in range(aleatorio.randint(1, 3))))
+
+    for nome, lista in (("com resultado", consultas), ("sem resultado", semResultado),
+                        ("prefixo curto", curtas)):
+        p50, p99 = mede(indice.busca, lista)
+        print(f"índice {nome:13}: p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+    p50, p99 = mede(lambda texto: varredura(itens, texto), consultas[:50])
+    print(f"varredura           : p50 {p50:7.3f} ms  p99 {p99:7.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
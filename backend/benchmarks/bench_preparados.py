@@ -0,0 +1,68 @@
+# benchmarks/bench_preparados.py
+# Compara a latência dos SQLs mais usados com e sem o cache de comandos
+# preparados. Precisa do banco configurado em config.DB_CONFIG.
+#
+#   cd backend
+#   python -m benchmarks.bench_preparados [iteracoes] [cpf]
+import statistics
+import sys
+import time
+
+from flask import Flask
+
+from db import Db, Mode
+from preparados import cachePreparados
+
+CONSULTAS = {
+    "post_login_acesso": """
+        SELECT nomUsuario,
+               desSenha,
+               idtPapel,
+               idtAtivo
+          FROM Usuario
+         WHERE codUsuarioCPF = %s
+    """,
+    "obter_medicamentos": "SELECT idMedicamento, nomMedicamento, desDosagem FROM Medicamento WHERE idtAtivo = true ORDER BY nomMedicamento",
+    "listar_minhas_solicitacoes": """
+        SELECT 
+            s.idSolicitacao, 
+            m.nomMedicamento, 
+            to_char(s.datSolicitacao, 'DD/MM/YYYY') as data_formatada,
+            s.desStatus
+        FROM Solicitacao s
+        JOIN Medicamento m ON s.idMedicamento = m.idMedicamento
+        WHERE s.codUsuarioCPF = %s
+        ORDER BY s.datSolicitacao DESC
+    """,
+}
+
+
+def mede(sql, params, iteracoes):
+    tempos = []
+    for _ in range(iteracoes):
+        inicio = time.perf_counter()
+        Db(debug=False).execSql(sql, params, Mode.SELECT)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return statistics.mean(tempos), tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.99) - 1]
+
+
+def main():
+    iteracoes = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    cpf = sys.argv[2] if len(sys.argv) > 2 else "11111111111"
+
+    # execSql monta respostas com jsonify, que exige um app context
+    with Flask(__name__).app_context():
+        print(f"{'rota':30} {'modo':10} {'média ms':>10} {'p50 ms':>10} {'p99 ms':>10}")
+        for rota, sql in CONSULTAS.items():
+            params = (cpf,) if "%s" in sql else None
+            for ativo in (False, True):
+                cachePreparados.ativo = ativo
+                mede(sql, params, 50)  # aquecimento (e PREPARE, quando ativo)
+                media, p50, p99 = mede(sql, params, iteracoes)
+                modo = "preparado" if ativo else "direto"
+                print(f"{rota:30} {modo:10} {media:10.3f} {p50:10.3f} {p99:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
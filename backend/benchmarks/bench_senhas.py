@@ -0,0 +1,45 @@
+# benchmarks/bench_senhas.py
+# Logins por segundo (só a verificação bcrypt) com o checkpw direto na
+# thread da requisição e com o ServicoSenhas. Não precisa de banco.
+#
+#   cd backend
+#   python -m benchmarks.bench_senhas [logins] [threads]
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+from senhas import ServicoSenhas
+
+SENHA = "senha123"
+
+
+def mede(verifica, logins, threads):
+    with ThreadPoolExecutor(threads) as executor:
+        inicio = time.perf_counter()
+        list(executor.map(lambda _: verifica(), range(logins)))
+        return logins / (time.perf_counter() - inicio)
+
+
+def main():
+    logins = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+    nucleos = os.cpu_count() or 1
+
+    for custo in (10, 12):
+        hashed = bcrypt.hashpw(SENHA.encode('utf-8'), bcrypt.gensalt(rounds=custo))
+
+        direto = mede(lambda: bcrypt.checkpw(SENHA.encode('utf-8'), hashed), logins, threads)
+        print(f"custo {custo} direto         : {direto:8.1f} logins/s ({direto / nucleos:6.1f} por núcleo)")
+
+        for executor in ("thread", "process"):
+            servico = ServicoSenhas(executor=executor, maxFila=logins, custo=custo)
+            servico.verifica(SENHA, hashed.decode('utf-8'))  # sobe os trabalhadores
+            taxa = mede(lambda: servico.verifica(SENHA, hashed.decode('utf-8')), logins, threads)
+            print(f"custo {custo} pool {executor:8}: {taxa:8.1f} logins/s ({taxa / nucleos:6.1f} por núcleo)")
+
+
+if __name__ == "__main__":
+    main()
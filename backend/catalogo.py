@@ -0,0 +1,106 @@
+# catalogo.py
+import bisect
+import hashlib
+import json
+import threading
+import time
+
+from config import CATALOGO
+from db import Db, Mode
+from replicas import fixaPrimario
+from util import normaliza
+
+
+def _ordem(item):
+    # a mesma chave na carga e em adiciona(): a ordem (e o ETag) não depende
+    # de o catálogo ter sido relido ou alterado em memória, nem da collation
+    return (normaliza(item["nome"]), item["nome"], item["id"])
+
+
+"""
+    Catálogo de medicamentos ativos já serializado em JSON, com ETag.
+
+    cadastrar_medicamento e excluir_medicamento chamam adiciona/remove,
+    que atualizam a lista já carregada e os ouvintes (ex.: o índice de
+    busca) sem ir ao banco. invalida() força a releitura, feita uma única
+    vez (as demais requisições esperam pelo lock). O ETag é o hash do
+    corpo, então é o mesmo em todos os workers para o mesmo conteúdo.
+    """
+class CatalogoMedicamentos:
+    def __init__(self, ttlSeg=300):
+        self.ttlSeg = ttlSeg
+        self.versao = 0
+        self.itens = []
+        self._publicado = (None, None)     # (corpo, etag) trocados juntos
+        self._versaoCarregada = -1
+        self._carregadoEm = 0.0
+        self._lock = threading.Lock()
+        self.ouvintes = []    # objetos com reconstroi(itens), adiciona(item) e remove(id)
+
+    def obter(self):
+        """Devolve (corpo, etag), ou (resposta de erro do Db, None)."""
+        if self._atual():
+            return self._publicado
+
+        with self._lock:
+            if not self._atual():
+                erro = self._carrega()
+                if erro is not None:
+                    return erro, None
+            return self._publicado
+
+    def invalida(self):
+        with self._lock:
+            self.versao += 1
+
+    def adiciona(self, item):
+        with self._lock:
+            if not self._carregado():
+                self.versao += 1
+                return
+            chaves = [_ordem(i) for i in self.itens]
+            self.itens.insert(bisect.bisect_right(chaves, _ordem(item)), item)
+            self._publica()
+            for ouvinte in self.ouvintes:
+                ouvinte.adiciona(item)
+
+    def remove(self, idMedicamento):
+        with self._lock:
+            if not self._carregado():
+                self.versao += 1
+                return
+            self.itens = [i for i in self.itens if i["id"] != idMedicamento]
+            self._publica()
+            for ouvinte in self.ouvintes:
+                ouvinte.remove(idMedicamento)
+
+    def _carregado(self):
+        return self._versaoCarregada == self.versao and self._publicado[0] is not None
+
+    def _publica(self):
+        corpo = json.dumps(self.itens, ensure_ascii=False).encode("utf-8")
+        self._publicado = (corpo, hashlib.sha1(corpo).hexdigest())
+
+    def _atual(self):
+        return (self._versaoCarregada == self.versao
+                and time.monotonic() - self._carregadoEm < self.ttlSeg)
+
+    def _carrega(self):
+        versao = self.versao
+        # logo após uma alteração a réplica pode estar atrasada: lê do primário
+        fixaPrimario()
+        sql = "SELECT idMedicamento, nomMedicamento, desDosagem FROM Medicamento WHERE idtAtivo = true"
+        resultados = Db().execSql(sql, mode=Mode.SELECT)
+        if not isinstance(resultados, list):
+            return resultados
+
+        self.itens = sorted(({"id": row[0], "nome": row[1], "dosagem": row[2]} for row in resultados), key=_ordem)
+        self._publica()
+        for ouvinte in self.ouvintes:
+            ouvinte.reconstroi(self.itens)
+        self._versaoCarregada = versao
+        self._carregadoEm = time.monotonic()
+        return None
+
+
+catalogo = CatalogoMedicamentos(**CATALOGO)
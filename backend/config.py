@@ -1,3 +1,5 @@
+import os
+
 DB_CONFIG = {
     "dbname": "postgres",
     "user": "postgres",
@@ -5,3 +7,155 @@ DB_CONFIG = {
     "host": "localhost",
     "port": "5432"
 }
+
+
+# Pool de conexões (ver pool.py)
+DB_POOL = {
+    "minconn": 1,
+    "maxconn": 10,
+    "timeoutEspera": 5,          # segundos aguardando uma conexão livre
+    "tentativasConexao": 3,      # reconexão com backoff exponencial
+    "backoffInicial": 0.2,
+    "intervaloVerificacao": 30   # segundos ociosa antes de testar com SELECT 1
+}
+
+
+# Mostra no console cada SQL executado e a resposta (caro, só para desenvolvimento)
+DB_DEBUG = True
+
+# Métricas por consulta (ver metricas.py)
+DB_METRICAS = {
+    "ativo": True,
+    "limiteLentaMs": 200,                 # acima disso grava no log de consultas lentas
+    "arquivoLentas": "consultas_lentas.log",
+    "maxConsultas": 500                   # quantidade de SQLs distintos acompanhados
+}
+
+# Cache de comandos preparados por conexão do pool (ver preparados.py)
+DB_PREPARADOS = {
+    "ativo": True,
+    "minUsos": 3,          # execuções do mesmo SQL antes de fazer o PREPARE
+    "maxPorConexao": 50    # LRU: acima disso o menos usado recebe DEALLOCATE
+}
+
+# Pool do DbAsync (psycopg 3 / psycopg_pool, ver db_async.py)
+DB_POOL_ASYNC = {
+    "min_size": 1,
+    "max_size": 10,
+    "timeout": 5            # segundos aguardando uma conexão livre
+}
+
+# Réplicas de leitura: lista de dicts no mesmo formato do DB_CONFIG.
+# Vazia = todas as leituras vão para o primário (ver replicas.py)
+DB_REPLICAS = []
+DB_REPLICAS_OPCOES = {
+    "tempoEjecao": 30,      # segundos fora do rodízio após uma falha
+    "janelaPrimario": 5     # segundos lendo do primário após uma escrita
+}
+
+# Hash de senhas fora da thread da requisição (ver senhas.py)
+SENHAS = {
+    "executor": "thread",   # "thread" (o bcrypt libera o GIL) ou "process"
+    "trabalhadores": None,  # None = um por núcleo
+    "maxFila": 64,          # hashes pendentes antes de recusar com 503
+    "custo": 12             # rounds do bcrypt; hashes com custo diferente são refeitos no login
+}
+
+# Token de sessão assinado (HMAC) devolvido no login (ver sessao.py)
+SESSAO = {
+    # obrigatório, fora do repositório: quem conhece o segredo emite token de qualquer papel
+    # ex.: export SEGREDO_SESSAO=$(python -c "import secrets; print(secrets.token_urlsafe(48))")
+    "segredo": os.environ.get("SEGREDO_SESSAO"),
+    "validadeSeg": 8 * 3600,
+    "maxCache": 10000       # tokens já verificados mantidos em memória (LRU)
+}
+
+# Cache em memória dos registros de Usuario usados no login (ver usuarios.py)
+CACHE_USUARIOS = {
+    "ttlSeg": 60,
+    "maxItens": 10000
+}
+
+# Proxies reversos confiáveis na frente do Flask (ver app.py). Com 0 o IP do cliente
+# é o da conexão: atrás de proxy/NAT todos dividiriam o mesmo limite "loginIp".
+# Use o número exato de proxies: a mais, o cliente forja o X-Forwarded-For.
+PROXY = {
+    "saltos": int(os.environ.get("PROXY_SALTOS", "0"))
+}
+
+# Limite de requisições (token bucket) das rotas de login (ver limitador.py)
+LIMITES = {
+    "loginIp":  {"capacidade": 30, "taxaPorSeg": 1.0},   # rajada de 30, depois 1/s por IP
+    "loginCpf": {"capacidade": 5,  "taxaPorSeg": 0.1},   # 5 tentativas, depois 1 a cada 10s por CPF
+    "maxChaves": 100000,    # chaves acompanhadas por limitador
+    "ociosoSeg": 600        # chave sem uso há mais tempo que isso é descartada
+}
+
+# Catálogo de medicamentos serializado em memória (ver catalogo.py)
+CATALOGO = {
+    "ttlSeg": 300   # releitura periódica: com vários workers a versão só muda no processo que alterou
+}
+
+# Importação do catálogo de medicamentos por CSV (ver importacao.py)
+IMPORTACAO = {
+    "prazoMs": 120000,  # arquivos grandes: prazo bem maior que o das rotas comuns
+    "maxErros": 100     # erros por linha devolvidos na resposta (os demais só são contados)
+}
+
+# Paginação por keyset das listagens (ver listar_solicitacoes)
+PAGINACAO = {
+    "tamanhoPadrao": 50,
+    "tamanhoMaximo": 200
+}
+
+# Reserva de solicitações para analistas (ver reservas.py)
+RESERVAS = {
+    "validadeSeg": 900,     # reserva não avaliada nesse tempo volta para a fila
+    "maxPorPedido": 50
+}
+
+# Avaliação em lote (ver avaliar_solicitacoes)
+AVALIACAO = {
+    "maxLote": 1000     # solicitações por requisição
+}
+
+# Eventos de solicitações em tempo real: LISTEN/NOTIFY -> SSE (ver eventos.py)
+EVENTOS = {
+    "canal": "solicitacoes",    # canal do NOTIFY (trigger em BancoDadosNovo.sql)
+    "heartbeatSeg": 15,         # comentário SSE enviado quando não há eventos
+    "maxBufferCliente": 100,    # eventos pendentes por cliente; acima disso a conexão é encerrada
+    "historico": 1000,          # eventos recentes guardados para retomar via Last-Event-ID
+    "maxAssinantes": 500        # conexões SSE simultâneas por processo
+}
+
+# Cache por CPF do histórico de solicitações do cidadão (ver historico.py)
+CACHE_HISTORICO = {
+    "ttlSeg": 60,
+    "maxItens": 10000
+}
+
+# Anexos das solicitações, gravados pelo hash do conteúdo (ver documentos.py)
+DOCUMENTOS = {
+    "diretorio": "documentos",
+    "maxBytes": 10 * 1024 * 1024,   # por arquivo, conferido durante o recebimento
+    "maxArquivos": 5,
+    "maxAgeSeg": 3600,              # cache do navegador no download (conteúdo nunca muda)
+    "maxCache": 10000,              # dados de documentos mantidos em memória para o download
+    "orfaosSeg": 86400              # arquivo sem solicitação apagado depois de parado por este tempo
+}
+
+# Fila de tarefas em segundo plano e o trabalhador que as executa (ver tarefas.py)
+TAREFAS = {
+    "executor": "thread",       # "thread" ou "process" (tarefas pesadas em CPU)
+    "trabalhadores": 4,         # tarefas simultâneas no processo trabalhador
+    "intervaloSeg": 1.0,        # espera entre buscas quando a fila está vazia
+    "leaseSeg": 300,            # tarefa sem resposta nesse tempo volta para a fila
+    "maxTentativas": 5,         # depois disso a tarefa vai para FALHA
+    "backoffBaseSeg": 5,        # espera antes da nova tentativa: base * 2^(tentativa-1)
+    "backoffMaxSeg": 3600,
+    "retencaoSeg": 7 * 86400,   # concluídas mais antigas que isso são apagadas
+    "tipos": {                  # por tipo: concorrencia e maxTentativas
+        "verifica_elegibilidade": {"concorrencia": 4},
+        "confere_documentos": {"concorrencia": 2, "maxTentativas": 3},
+    }
+}
@@ -1,15 +1,125 @@
 # db.py
 import psycopg2
+import psycopg2.errors
+import psycopg2.extras
+import psycopg2.sql
+import contextlib
+import itertools
 import logging
-from config import DB_CONFIG
 import enum
+import time
+import uuid
 from flask import jsonify
+from config import DB_DEBUG
+from metricas import metricasDb
+from pool import PoolEsgotado, getPool
+from prazos import PrazoEsgotado, comandoTimeout, marcaEstouro, restanteMs
+from preparados import cachePreparados
+from replicas import getRoteador, lerDoPrimario, marcaEscrita
+
+def _paginas(linhas, tamanho):
+    # consome o iterável em blocos, sem materializar tudo em memória
+    it = iter(linhas)
+    while True:
+        pagina = list(itertools.islice(it, tamanho))
+        if not pagina:
+            return
+        yield pagina
+
+
+class _ArquivoCopy:
+    """Arquivo somente leitura que gera, sob demanda, o CSV do COPY a
+    partir de um iterável de linhas (tuplas)."""
+    def __init__(self, linhas):
+        self._linhas = iter(linhas)
+        self._resto = ""
+        self.qtdLinhas = 0
+
+    def read(self, size=-1):
+        partes = [self._resto]
+        tamanho = len(self._resto)
+        while size < 0 or tamanho < size:
+            linha = next(self._linhas, None)
+            if linha is None:
+                break
+            texto = ",".join(self._campo(v) for v in linha) + "\n"
+            partes.append(texto)
+            tamanho += len(texto)
+            self.qtdLinhas += 1
+
+        dados = "".join(partes)
+        if size < 0:
+            self._resto = ""
+            return dados
+        self._resto = dados[size:]
+        return dados[:size]
+
+    @staticmethod
+    def _campo(valor):
+        # no CSV do COPY campo vazio sem aspas é NULL; entre aspas é string vazia
+        if valor is None:
+            return ""
+        return '"' + str(valor).replace('"', '""') + '"'
+
+
+class _LinhasStream:
+    """Linhas de um Mode.STREAM. close() devolve o cursor e a conexão
+    mesmo que a iteração nunca tenha começado (HEAD, 304, cliente que
+    desconectou antes do envio): o finally de um gerador que não começou
+    não roda, então a liberação não pode depender dele."""
+    def __init__(self, db, pool, conn, cursor, proprio, sql, inicio, primeiroLote):
+        self._db = db
+        self._pool = pool
+        self._conn = conn
+        self._cursor = cursor
+        self._proprio = proprio
+        self._sql = sql
+        self._inicio = inicio
+        self._primeiroLote = primeiroLote
+        self._descartar = False
+        self._fechado = False
+
+    def __iter__(self):
+        linhas = 0
+        try:
+            for linha in itertools.chain(self._primeiroLote, self._cursor):
+                linhas += 1
+                yield linha
+            self._db._registraMetrica(self._sql, self._inicio, linhas)
+        except psycopg2.errors.QueryCanceled:
+            # prazo estourado no meio do envio: a conexão volta ao pool (o
+            # devolver faz o rollback)
+            marcaEstouro()
+            raise
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            self._descartar = True
+            getRoteador().ejeta(self._pool, e)
+            raise
+        finally:
+            self.close()
+
+    def close(self):
+        if self._fechado:
+            return
+        self._fechado = True
+        try:
+            self._cursor.close()
+        except Exception:
+            self._descartar = True
+        if self._proprio:
+            self._pool.devolver(self._conn, descartar=self._descartar)
+
+    def __del__(self):
+        # rota que recebeu as linhas e não as entregou: a conexão não pode vazar
+        self.close()
+
 
 class Mode(enum.Enum):
     SELECT = 1
     BEGIN = 2
     DEFAULT = 3
     COMMIT = 4
+    STREAM = 5
 
 
 """
@@ -24,15 +134,20 @@ class Mode(enum.Enum):
           BEGIN -> só conecta ou inicia uma transaçao explicita)
           DEFAULT -> conecta se não houver conexão e commita se not inTransactio
           COMMIT -> só comita (fim de transação explicita)
-          SELECT -> espera retornar dados
+          SELECT -> espera retornar dados (fora de transação explícita
+                    vai para uma réplica de leitura, se houver)
+          STREAM -> como SELECT, mas devolve um gerador que busca as linhas
+                    em lotes de itersize por um cursor nomeado (server-side)
                           
     Returns:
         list: Uma lista de resultados da consulta 
-        (se for um SELECT), ou None em caso de erro ou outras consultas.
+        (se for um SELECT), um gerador de linhas (se for STREAM),
+        ou None em caso de erro ou outras consultas.
     """
 class Db:
-    def __init__(self, debug=True):
-        self.debug = debug
+    def __init__(self, debug=None, itersize=2000):
+        self.debug = DB_DEBUG if debug is None else debug
+        self.itersize = itersize
         self.conn = None
         self.cursor = None
         self.inTransaction = False
@@ -40,6 +155,9 @@ class Db:
         self.tipo= "SUCESSO"  # AVISO ou ERRO
         self.mensagem = []
         self.qtdAtu = 0
+        self._descartarConexao = False
+        self._esperaMs = 0.0
+        self._poolConn = None
 
         logging.basicConfig(level=logging.ERROR,
                             filename='app.log',
@@ -47,6 +165,9 @@ class Db:
                             format='%(asctime)s - %(levelname)s - %(message)s')
 
     def execSql(self, sql: str, params: tuple=None, mode: Mode=Mode.DEFAULT, atuIdInsert: bool =False):
+        if mode == Mode.STREAM:
+            return self._execStream(sql, params)
+
         results = None
         try:
             if mode == Mode.BEGIN:
@@ -54,7 +175,7 @@ class Db:
                 sql = "BEGIN;\n" + sql
                 
             if not self.conn:    
-                self.conn = self._get_connection()
+                self._poolConn, self.conn = self._get_connection(leitura=(mode == Mode.SELECT))
                 self.cursor = self.conn.cursor()
                 self.mensagem = []
             
@@ -64,11 +185,25 @@ class Db:
                 print(full_sql)
                 print(" Fim Sql 🛢️")
 
-            self.cursor.execute(sql, params)
+            sqlExec = sql
+            if mode in (Mode.SELECT, Mode.DEFAULT):
+                # SQL frequente vira EXECUTE de um comando preparado na conexão
+                sqlExec, params = cachePreparados.traduz(self.conn, self.cursor, sql, params)
+
+            timeout = comandoTimeout()
+            if timeout:
+                # prazo da rota vai junto, na mesma ida ao banco
+                sqlExec = f"{timeout};\n{sqlExec}"
+
+            inicio = time.perf_counter()
+            self.cursor.execute(sqlExec, params)
             
             if mode == Mode.SELECT:
                 results = self.cursor.fetchall()
+                self._registraMetrica(sql, inicio, len(results))
                 return results
+
+            self._registraMetrica(sql, inicio, self.cursor.rowcount)
             
             if atuIdInsert:
                 # busca o id da linha inserida
@@ -87,20 +222,11 @@ class Db:
                 self.mensagem.append(f"Atualização realizada com sucesso{self._getMsgAtu()}")
 
             self.conn.commit()
+            marcaEscrita()
             results = {"tipo": self.tipo, "mensagem": self.mensagem}
             return jsonify(results), 200
         except Exception as e:
-            self.tipo = "ERRO"
-            try:
-                self.mensagem.append(str(e))
-                logging.error(str(e))
-            except Exception as log_err:
-                self.mensagem.append("Erro desconhecido")
-                logging.error("Erro ao logar exceção: %s", log_err)
-
-            if self.conn:
-                self.conn.rollback()
-             
+            self._registraErro(e, self.conn, self._poolConn)
             results = {"tipo": "ERRO", "mensagem": self.mensagem}
             return jsonify(results), 401
         finally:
@@ -109,17 +235,222 @@ class Db:
                 print(results)
                 print("Fim Resposta API")
 
-            if self.conn and not self.inTransaction:
-                self.cursor.close()
-                self.conn.close()
-                self.conn = None
+            if self.conn and (not self.inTransaction or self._descartarConexao):
+                self._devolveConexao()
              
 
+    def execLote(self, sql: str, linhas, template: str=None, tamanhoPagina: int=500):
+        """INSERT (ou upsert com ON CONFLICT) de várias linhas com
+        execute_values. O sql deve ter um único %s no lugar da lista de
+        VALUES. As linhas são enviadas em páginas de tamanhoPagina, todas
+        na mesma transação."""
+        def executa(cursor):
+            total = 0
+            for pagina in _paginas(linhas, tamanhoPagina):
+                psycopg2.extras.execute_values(cursor, sql, pagina, template=template,
+                                               page_size=len(pagina))
+                total += max(cursor.rowcount, 0)
+            return total
+
+        return self._execEmLote(sql, executa)
+
+    def execCopy(self, tabela: str, colunas: list, linhas):
+        """COPY FROM STDIN a partir de qualquer iterável de linhas. O CSV
+        é gerado sob demanda enquanto o PostgreSQL lê, então o lote
+        inteiro nunca fica em memória."""
+        # as tabelas foram criadas sem aspas, então os nomes ficam em minúsculas
+        sql = psycopg2.sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(
+            psycopg2.sql.Identifier(tabela.lower()),
+            psycopg2.sql.SQL(", ").join(psycopg2.sql.Identifier(c.lower()) for c in colunas))
+
+        def executa(cursor):
+            arquivo = _ArquivoCopy(linhas)
+            cursor.copy_expert(sql, arquivo)
+            return arquivo.qtdLinhas
+
+        return self._execEmLote(f"COPY {tabela} ({', '.join(colunas)}) FROM STDIN", executa)
+
+    def _execEmLote(self, sql, executa):
+        results = None
+        try:
+            if not self.conn:
+                self._poolConn, self.conn = self._get_connection()
+                self.cursor = self.conn.cursor()
+                self.mensagem = []
+
+            timeout = comandoTimeout()
+            if timeout:
+                self.cursor.execute(timeout)
+
+            if self.debug:
+                print("🛢️ Mostrando SQL (lote)")
+                print(sql)
+                print(" Fim Sql 🛢️")
+
+            inicio = time.perf_counter()
+            qtd = executa(self.cursor)
+            self._registraMetrica(sql, inicio, qtd)
+            self.qtdAtu += qtd
+
+            if self.inTransaction:
+                results = ''
+                return results
+
+            self.mensagem.append(f"Atualização realizada com sucesso{self._getMsgAtu()}")
+            self.conn.commit()
+            marcaEscrita()
+            results = {"tipo": self.tipo, "mensagem": self.mensagem}
+            return jsonify(results), 200
+        except Exception as e:
+            self._registraErro(e, self.conn, self._poolConn)
+            results = {"tipo": "ERRO", "mensagem": self.mensagem}
+            return jsonify(results), 401
+        finally:
+            if self.debug:
+                print("Resposta API")
+                print(results)
+                print("Fim Resposta API")
+
+            if self.conn and (not self.inTransaction or self._descartarConexao):
+                self._devolveConexao()
+
+    def _execStream(self, sql, params):
+        # dentro de uma transação explícita o cursor usa a conexão dela
+        proprio = self.conn is None
+        conn = self.conn
+        pool = self._poolConn
+        try:
+            if proprio:
+                pool, conn = self._get_connection(leitura=True)
+                self.mensagem = []
+
+            timeout = comandoTimeout()
+            if timeout:
+                # cursor nomeado não aceita vários comandos: SET LOCAL à parte
+                with conn.cursor() as cursorTimeout:
+                    cursorTimeout.execute(timeout)
+
+            cursor = conn.cursor(name=f"stream_{uuid.uuid4().hex}")
+            cursor.itersize = self.itersize
+
+            if self.debug:
+                print("🛢️ Mostrando SQL (stream)")
+                print(cursor.mogrify(sql, params).decode("utf-8"))
+                print(" Fim Sql 🛢️")
+
+            inicio = time.perf_counter()
+            cursor.execute(sql, params)
+            # o primeiro lote é buscado aqui: erros da consulta (inclusive prazo
+            # estourado) viram resposta de erro antes de começar o envio
+            primeiroLote = cursor.fetchmany(self.itersize)
+        except Exception as e:
+            self._registraErro(e, conn, pool)
+            if proprio and conn is not None:
+                pool.devolver(conn, descartar=self._descartarConexao)
+                self._descartarConexao = False
+            return jsonify({"tipo": "ERRO", "mensagem": self.mensagem}), 401
+
+        return _LinhasStream(self, pool, conn, cursor, proprio, sql, inicio, primeiroLote)
+
+    def _registraErro(self, e, conn, pool=None):
+        self.tipo = "ERRO"
+        try:
+            self.mensagem.append(str(e))
+            logging.error(str(e))
+        except Exception as log_err:
+            self.mensagem.append("Erro desconhecido")
+            logging.error("Erro ao logar exceção: %s", log_err)
+
+        if isinstance(e, (psycopg2.errors.QueryCanceled, PrazoEsgotado)):
+            # statement_timeout do prazo da rota: a rota responde 503. Testado
+            # antes de OperationalError (QueryCanceled é subclasse dele): a
+            # conexão está sã, só precisa do rollback abaixo
+            marcaEstouro()
+        elif isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError)):
+            # conexão quebrada não volta para o pool
+            self._descartarConexao = True
+            if pool is not None:
+                getRoteador().ejeta(pool, e)
+        elif isinstance(e, PoolEsgotado) and restanteMs() is not None:
+            marcaEstouro()
+        elif isinstance(e, psycopg2.errors.InvalidSqlStatementName) and conn:
+            # comando preparado sumiu da sessão (ex.: DISCARD ALL): prepara de novo
+            cachePreparados.invalida(conn)
+
+        if conn and not self._descartarConexao:
+            try:
+                conn.rollback()
+            except Exception:
+                self._descartarConexao = True
+        # a transação explícita (Mode.BEGIN) acabou junto com o rollback
+        self.inTransaction = False
+
+    def __del__(self):
+        # transação explícita abandonada pela rota: a conexão não pode vazar do pool
+        if getattr(self, "conn", None) is not None:
+            self._descartarConexao = True
+            self._devolveConexao()
+
+    def transaction(self):
+        """Transação com os comandos enfileirados e enviados juntos:
+
+            with db.transaction() as tx:
+                tx.execSql(sql1, params1)
+                with tx.savepoint():
+                    tx.execSql(sql2, params2)
+            linhas = tx.resultado
+
+        Commit na saída do bloco, rollback automático se houver exceção
+        (a exceção segue para a rota)."""
+        return Transacao(self)
+
     def getIdInsert(self):
         return self.idInsert
     
-    def _get_connection(self):
-        return psycopg2.connect(**DB_CONFIG)
+    def _get_connection(self, leitura=False):
+        # devolve (pool, conexão): leituras fora de transação explícita vão
+        # para uma réplica, a não ser que a requisição já tenha escrito
+        inicio = time.perf_counter()
+        conn = None
+        pool = None
+        restante = restanteMs()
+        timeout = None if restante is None else max(restante, 0) / 1000
+        if leitura and not self.inTransaction and not lerDoPrimario():
+            pool = getRoteador().poolLeitura()
+            if pool is not None:
+                try:
+                    conn = pool.obter(timeout)
+                except PoolEsgotado:
+                    # réplica ocupada, mas saudável: a leitura vai para o primário
+                    conn = None
+                except psycopg2.OperationalError as e:
+                    getRoteador().ejeta(pool, e)
+
+        if conn is None:
+            pool = getPool()
+            restante = restanteMs()
+            conn = pool.obter(None if restante is None else max(restante, 0) / 1000)
+
+        self._esperaMs = (time.perf_counter() - inicio) * 1000
+        return pool, conn
+
+    def _registraMetrica(self, sql, inicio, linhas):
+        # a espera pela conexão é atribuída ao primeiro SQL executado nela
+        if metricasDb.ativo:
+            metricasDb.registra(sql, (time.perf_counter() - inicio) * 1000, linhas, self._esperaMs)
+        self._esperaMs = 0.0
+
+    def _devolveConexao(self):
+        try:
+            self.cursor.close()
+        except Exception:
+            pass
+        self._poolConn.devolver(self.conn, descartar=self._descartarConexao)
+        self._poolConn = None
+        self.conn = None
+        self.cursor = None
+        self.inTransaction = False
+        self._descartarConexao = False
     
     def _getMsgAtu(self):
         msgAtu = ''
@@ -139,4 +470,164 @@ class Db:
         except Exception:
             results = {"tipo": self.tipo, "mensagem": "Erro desconhecido ao formatar mensagem"}
 
-        return jsonify(results), 500
\ No newline at end of file
+        return jsonify(results), 500
+
+
+"""
+    Transação que junta os comandos em poucas idas ao banco.
+
+    execSql só enfileira o comando (já interpolado com mogrify). A fila é
+    enviada em um único execute quando a rota precisa de um resultado
+    (consulta) ou na saída do bloco with. A conexão fica em autocommit e
+    a transação é controlada pelo próprio texto enviado:
+
+      - se tudo couber em um único envio e não houver savepoints, a fila
+        vai sem BEGIN/COMMIT: vários comandos em uma só mensagem já rodam
+        em uma transação implícita do PostgreSQL (uma ida ao banco), e as
+        linhas do último comando ficam em tx.resultado;
+      - senão a fila do primeiro envio começa com BEGIN e a do último
+        termina com COMMIT.
+    """
+class Transacao:
+    def __init__(self, db):
+        self.db = db
+        self.pool = None
+        self.conn = None
+        self.cursor = None
+        self.resultado = None
+        self._fila = []
+        self._textos = []          # SQL da fila antes da interpolação: chave das métricas
+        self._aberta = False       # BEGIN já foi enviado
+        self._savepoints = 0
+        self._envios = 0
+
+    def __enter__(self):
+        self.db.mensagem = []
+        try:
+            self.pool, self.conn = self.db._get_connection()
+            self.conn.autocommit = True
+            self.cursor = self.conn.cursor()
+        except Exception as e:
+            # PoolEsgotado/QueryCanceled com prazo ativo viram 503 (marcaEstouro)
+            self.db._registraErro(e, None)
+            if self.conn is not None:
+                self.pool.devolver(self.conn, descartar=True)
+                self.conn = None
+            self.db._descartarConexao = False
+            raise
+        return self
+
+    def __exit__(self, tipoExc, exc, tb):
+        descartar = False
+        erro = exc
+        try:
+            if erro is None:
+                try:
+                    self._commit()
+                except Exception as e:
+                    erro = e
+
+            if erro is not None:
+                self.db._registraErro(erro, None)
+                descartar = self.db._descartarConexao
+                if self._aberta and not descartar:
+                    try:
+                        self.cursor.execute("ROLLBACK")
+                    except Exception:
+                        descartar = True
+                if erro is not exc:
+                    raise erro
+        finally:
+            try:
+                self.cursor.close()
+                self.conn.autocommit = False
+            except Exception:
+                descartar = True
+            self.pool.devolver(self.conn, descartar=descartar)
+            self.db._descartarConexao = False
+            self.conn = None
+        return False
+
+    def execSql(self, sql: str, params: tuple=None):
+        """Enfileira o comando; ele vai ao banco no próximo envio."""
+        if self.db.debug:
+            print("🛢️ Enfileirando SQL")
+        self._fila.append(self.cursor.mogrify(sql, params))
+        self._textos.append(sql)
+
+    def consulta(self, sql: str, params: tuple=None):
+        """Envia a fila junto com este SELECT (uma ida ao banco) e devolve as linhas."""
+        self.execSql(sql, params)
+        self._envia(abreTransacao=True)
+        return self.cursor.fetchall()
+
+    @contextlib.contextmanager
+    def savepoint(self):
+        self._savepoints += 1
+        nome = f"sp_{self._savepoints}"
+        marca = len(self._fila)
+        marcaTextos = len(self._textos)
+        envios = self._envios
+        self._fila.append(f"SAVEPOINT {nome}".encode())
+        try:
+            yield self
+        except Exception:
+            if self._envios == envios:
+                # nada do savepoint chegou ao banco: basta descartar da fila
+                del self._fila[marca:]
+                del self._textos[marcaTextos:]
+            else:
+                self._fila.append(f"ROLLBACK TO SAVEPOINT {nome}".encode())
+            raise
+        else:
+            self._fila.append(f"RELEASE SAVEPOINT {nome}".encode())
+
+    def _commit(self):
+        if not self._aberta and self._savepoints == 0:
+            # transação implícita: a fila inteira em uma ida, já commitada
+            if self._fila:
+                self._envia(abreTransacao=False)
+                if self.cursor.description is not None:
+                    self.resultado = self.cursor.fetchall()
+        else:
+            self._fila.append(b"COMMIT")
+            self._envia(abreTransacao=False)
+            self._aberta = False
+
+        self.db.mensagem.append("Transação realizada com sucesso")
+        marcaEscrita()
+
+    def _envia(self, abreTransacao):
+        if not self._fila:
+            return
+
+        if abreTransacao and not self._aberta:
+            self._fila.insert(0, b"BEGIN")
+        elif not self._aberta and self._savepoints > 0:
+            # savepoint só existe dentro de um BEGIN explícito
+            self._fila.insert(0, b"BEGIN")
+            self._aberta = True
+        if abreTransacao:
+            self._aberta = True
+
+        timeout = comandoTimeout()
+        if timeout:
+            # SET LOCAL logo após o BEGIN (ou no início da transação implícita)
+            posicao = 1 if self._fila[0] == b"BEGIN" else 0
+            self._fila.insert(posicao, timeout.encode())
+
+        sql = b";\n".join(self._fila)
+        # com os valores interpolados cada chamada viraria uma consulta nova nas métricas
+        texto = ";\n".join(self._textos) or sql.decode("utf-8")
+        self._fila = []
+        self._textos = []
+        self._envios += 1
+
+        if self.db.debug:
+            print("🛢️ Mostrando SQL (transação)")
+            print(sql.decode("utf-8"))
+            print(" Fim Sql 🛢️")
+
+        inicio = time.perf_counter()
+        self.cursor.execute(sql)
+        self.db._registraMetrica(texto, inicio, max(self.cursor.rowcount, 0))
@@ -0,0 +1,200 @@
+# db_async.py
+import asyncio
+import logging
+import os
+import threading
+import time
+
+import psycopg
+import psycopg.conninfo
+from psycopg_pool import AsyncConnectionPool
+from flask import jsonify
+
+from config import DB_CONFIG, DB_DEBUG, DB_POOL_ASYNC
+from db import Mode
+from metricas import metricasDb
+from prazos import PrazoEsgotado, marcaEstouro, restanteMs
+
+
+"""
+    Loop de eventos em uma thread própria, dono do pool assíncrono.
+
+    O Flask roda cada view async em um loop de eventos criado para a
+    requisição, e um pool assíncrono só funciona no loop em que foi
+    aberto. Por isso todas as consultas do DbAsync são despachadas para
+    este loop, e a view apenas aguarda o resultado.
+    """
+class _MotorAsync:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.pool = None
+        self._thread = threading.Thread(target=self._roda, name="motor-db-async", daemon=True)
+        self._thread.start()
+        asyncio.run_coroutine_threadsafe(self._abrePool(), self.loop).result()
+
+    def _roda(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _abrePool(self):
+        self.pool = AsyncConnectionPool(psycopg.conninfo.make_conninfo(**DB_CONFIG),
+                                        open=False,
+                                        check=AsyncConnectionPool.check_connection,
+                                        **DB_POOL_ASYNC)
+        await self.pool.open()
+
+    async def executa(self, corrotina):
+        # roda no loop do motor e aguarda no loop de quem chamou
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(corrotina, self.loop))
+
+
+_motor = None
+_motorPid = None
+_motorLock = threading.Lock()
+
+
+def getMotor():
+    global _motor, _motorPid
+    if _motor is None or _motorPid != os.getpid():
+        with _motorLock:
+            if _motor is None or _motorPid != os.getpid():
+                _motor = _MotorAsync()
+                _motorPid = os.getpid()
+    return _motor
+
+
+"""
+    Versão assíncrona do Db para views `async def`.
+
+    Mesmo contrato do Db.execSql (modos BEGIN/DEFAULT/COMMIT/SELECT e
+    envelope {tipo, mensagem}), mas cada chamada deve ser aguardada com
+    await. Consultas independentes podem rodar ao mesmo tempo com
+    asyncio.gather, cada uma em seu próprio DbAsync (uma conexão cada).
+    Mode.STREAM não é suportado.
+    """
+class DbAsync:
+    def __init__(self, debug=None):
+        self.debug = DB_DEBUG if debug is None else debug
+        self.conn = None
+        self.inTransaction = False
+        self.idInsert = None
+        self.tipo = "SUCESSO"  # AVISO ou ERRO
+        self.mensagem = []
+        self.qtdAtu = 0
+
+    async def execSql(self, sql: str, params: tuple=None, mode: Mode=Mode.DEFAULT, atuIdInsert: bool=False):
+        if mode == Mode.STREAM:
+            raise ValueError("Mode.STREAM não é suportado pelo DbAsync")
+
+        # o prazo da rota é lido aqui: o loop do motor não vê o contexto do Flask
+        timeoutMs = restanteMs()
+        if timeoutMs is not None and timeoutMs < 1:
+            marcaEstouro()
+            raise PrazoEsgotado("Prazo da requisição esgotado antes de executar o SQL")
+
+        motor = getMotor()
+        results, status = await motor.executa(self._exec(motor.pool, sql, params, mode, atuIdInsert, timeoutMs))
+        if status == 503:
+            marcaEstouro()
+
+        if self.debug:
+            print("Resposta API")
+            print(results)
+            print("Fim Resposta API")
+
+        if status is None:
+            return results
+        return jsonify(results), status
+
+    def getIdInsert(self):
+        return self.idInsert
+
+    async def _exec(self, pool, sql, params, mode, atuIdInsert, timeoutMs=None):
+        # roda no loop do motor; devolve (resultado, status HTTP ou None)
+        try:
+            if mode == Mode.BEGIN:
+                # o psycopg abre a transação implicitamente no primeiro comando
+                self.inTransaction = True
+
+            esperaMs = 0.0
+            if not self.conn:
+                inicio = time.perf_counter()
+                self.conn = await pool.getconn(None if timeoutMs is None else timeoutMs / 1000)
+                esperaMs = (time.perf_counter() - inicio) * 1000
+                self.mensagem = []
+
+            async with self.conn.cursor() as cursor:
+                if self.debug:
+                    print("🛢️ Mostrando SQL (async)")
+                    print(sql, params)
+                    print(" Fim Sql 🛢️")
+
+                if timeoutMs is not None:
+                    # equivalente ao SET LOCAL statement_timeout do Db
+                    await cursor.execute("SELECT set_config('statement_timeout', %s, true)",
+                                         (str(int(timeoutMs)),))
+
+                inicio = time.perf_counter()
+                await cursor.execute(sql, params)
+
+                if mode == Mode.SELECT:
+                    results = await cursor.fetchall()
+                    self._registraMetrica(sql, inicio, len(results), esperaMs)
+                    return results, None
+
+                self._registraMetrica(sql, inicio, cursor.rowcount, esperaMs)
+
+                if atuIdInsert:
+                    # busca o id da linha inserida
+                    self.idInsert = (await cursor.fetchone())[0]
+
+                self.qtdAtu += cursor.rowcount
+
+            if mode == Mode.COMMIT:
+                self.mensagem.append(f"Transação realizada com sucesso{self._getMsgAtu()}")
+                self.inTransaction = False
+            else:
+                if self.inTransaction:
+                    return '', None
+
+                self.mensagem.append(f"Atualização realizada com sucesso{self._getMsgAtu()}")
+
+            await self.conn.commit()
+            return {"tipo": self.tipo, "mensagem": self.mensagem}, 200
+        except Exception as e:
+            self.tipo = "ERRO"
+            self.mensagem.append(str(e))
+            logging.error(str(e))
+
+            if self.conn and not self.conn.closed:
+                try:
+                    await self.conn.rollback()
+                except Exception as rollback_err:
+                    logging.error("Erro no rollback: %s", rollback_err)
+            # a transação explícita acabou junto com o rollback
+            self.inTransaction = False
+            if isinstance(e, psycopg.errors.QueryCanceled):
+                return {"tipo": "ERRO", "mensagem": self.mensagem}, 503
+            return {"tipo": "ERRO", "mensagem": self.mensagem}, 401
+        finally:
+            if self.conn and not self.inTransaction:
+                # SELECT deixa a transação implícita aberta: devolvida limpa, como no
+                # PoolConexoes.devolver (senão o psycopg_pool avisa e faz o rollback)
+                if not self.conn.closed and self.conn.info.transaction_status != psycopg.pq.TransactionStatus.IDLE:
+                    try:
+                        await self.conn.rollback()
+                    except Exception as rollback_err:
+                        logging.error("Erro no rollback: %s", rollback_err)
+                # o pool descarta sozinho conexões quebradas
+                await pool.putconn(self.conn)
+                self.conn = None
+
+    def _registraMetrica(self, sql, inicio, linhas, esperaMs):
+        if metricasDb.ativo:
+            metricasDb.registra(sql, (time.perf_counter() - inicio) * 1000, linhas, esperaMs)
+
+    def _getMsgAtu(self):
+        if self.qtdAtu == 0:
+            return ''
+        msgAtu = 'registro atualizado!' if self.qtdAtu == 1 else 'registros atualizados!'
+        return f" - {self.qtdAtu} {msgAtu}"
@@ -0,0 +1,279 @@
+# documentos.py
+import collections
+import hashlib
+import os
+import tempfile
+import threading
+import time
+
+from flask import send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.formparser import parse_form_data
+
+from config import DOCUMENTOS
+from db import Db, Mode
+
+# tipo -> assinatura no início do arquivo; o tipo gravado é o detectado, não o declarado
+ASSINATURAS = {
+    "application/pdf": b"%PDF-",
+    "image/jpeg": b"\xff\xd8\xff",
+    "image/png": b"\x89PNG\r\n\x1a\n",
+}
+
+# campos de texto do multipart (codUsuarioCPF, idMedicamento, observacao...)
+MAX_CAMPOS = 10
+MAX_TEXTO = 64 * 1024
+
+
+class RegistroDocumento:
+    __slots__ = ("nomArquivo", "desCaminho", "desTipo", "desHash", "codUsuarioCPF")
+
+    def __init__(self, nomArquivo, desCaminho, desTipo, desHash, codUsuarioCPF):
+        self.nomArquivo = nomArquivo
+        self.desCaminho = desCaminho
+        self.desTipo = desTipo
+        self.desHash = desHash
+        self.codUsuarioCPF = codUsuarioCPF.strip()
+
+
+class DocumentoInvalido(Exception):
+    """Anexo recusado durante o recebimento (tamanho, tipo ou quantidade)."""
+
+
+"""
+    Destino de um arquivo do multipart: o parser do werkzeug chama write()
+    a cada bloco lido da requisição, e cada bloco vai direto para um
+    temporário no disco enquanto o SHA-256 é calculado. O limite de
+    tamanho e o tipo (pela assinatura dos primeiros bytes) são conferidos
+    durante o recebimento, então um arquivo recusado para de ser lido
+    assim que o problema aparece.
+    """
+class ArquivoRecebido:
+    def __init__(self, diretorioTemp, nomeOriginal, maxBytes):
+        fd, self.caminhoTemp = tempfile.mkstemp(dir=diretorioTemp, prefix="upload-")
+        self._arquivo = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha256()
+        self._inicio = b""
+        self.nomeOriginal = nomeOriginal or "documento"
+        self.maxBytes = maxBytes
+        self.tamanho = 0
+        self.tipo = None
+
+    def write(self, dados):
+        self.tamanho += len(dados)
+        if self.tamanho > self.maxBytes:
+            raise DocumentoInvalido(f"Arquivo '{self.nomeOriginal}' maior que {self.maxBytes / (1024 * 1024):g} MB.")
+
+        if self.tipo is None:
+            self._inicio += dados[:16]
+            if len(self._inicio) >= 16:
+                self._detectaTipo()
+
+        self._hash.update(dados)
+        self._arquivo.write(dados)
+        return len(dados)
+
+    def seek(self, *args):
+        # chamado pelo parser ao fim do arquivo
+        self._arquivo.flush()
+
+    def close(self):
+        if not self._arquivo.closed:
+            self._arquivo.close()
+
+    def finaliza(self):
+        """Fecha o temporário e confere o tipo de arquivos menores que 16 bytes."""
+        self.close()
+        if self.tipo is None:
+            self._detectaTipo()
+        return self._hash.hexdigest()
+
+    def descarta(self):
+        self.close()
+        try:
+            os.unlink(self.caminhoTemp)
+        except FileNotFoundError:
+            pass
+
+    def _detectaTipo(self):
+        for tipo, assinatura in ASSINATURAS.items():
+            if self._inicio.startswith(assinatura):
+                self.tipo = tipo
+                return
+        raise DocumentoInvalido(f"Arquivo '{self.nomeOriginal}' não é PDF, JPEG ou PNG.")
+
+
+def _paradoDesde(caminho, limite):
+    try:
+        return os.stat(caminho).st_mtime < limite
+    except FileNotFoundError:
+        return False
+
+
+def _apaga(caminho):
+    try:
+        os.unlink(caminho)
+        return 1
+    except FileNotFoundError:
+        return 0
+
+
+"""
+    Armazenamento endereçado pelo conteúdo: o arquivo fica em
+    <diretorio>/<2 primeiros do hash>/<2 seguintes>/<sha256>. A mesma
+    receita reenviada em uma renovação gera o mesmo hash e não ocupa
+    espaço de novo; o caminho relativo é o que vai para desCaminho.
+    """
+class ArmazemDocumentos:
+    def __init__(self, diretorio="documentos", maxBytes=10 * 1024 * 1024, maxArquivos=5,
+                 maxAgeSeg=3600, maxCache=10000, orfaosSeg=86400):
+        self.diretorio = os.path.abspath(diretorio)
+        self.maxBytes = maxBytes
+        self.maxArquivos = maxArquivos
+        self.maxAgeSeg = maxAgeSeg
+        self.maxCache = maxCache
+        self.orfaosSeg = orfaosSeg
+        self._registros = collections.OrderedDict()   # idDocumento -> RegistroDocumento
+        self._lock = threading.Lock()
+        # temporários no mesmo sistema de arquivos: a publicação é um os.replace
+        self.diretorioTemp = os.path.join(self.diretorio, "tmp")
+
+    def recebe(self, environ):
+        """Lê o multipart da requisição em fluxo. Devolve (form, documentos),
+        com cada documento já publicado, ou levanta DocumentoInvalido."""
+        os.makedirs(self.diretorioTemp, exist_ok=True)
+        recebidos = []
+
+        def fabrica(total_content_length, content_type, filename, content_length=None):
+            if content_type not in ASSINATURAS and content_type not in (None, "application/octet-stream"):
+                raise DocumentoInvalido(f"Tipo de arquivo '{content_type}' não aceito (PDF, JPEG ou PNG).")
+            if len(recebidos) >= self.maxArquivos:
+                raise DocumentoInvalido(f"No máximo {self.maxArquivos} arquivos por solicitação.")
+            arquivo = ArquivoRecebido(self.diretorioTemp, filename, self.maxBytes)
+            recebidos.append(arquivo)
+            return arquivo
+
+        try:
+            # Nas versões atuais do Werkzeug max_form_memory_size limita também o
+            # buffer de leitura dos arquivos (blocos de 64 KB), então fica bem
+            # acima disso; os campos de texto são limitados por MAX_CAMPOS e
+            # MAX_TEXTO, conferidos logo abaixo
+            _, form, files = parse_form_data(environ, stream_factory=fabrica,
+                                             max_form_memory_size=1024 * 1024,
+                                             max_form_parts=self.maxArquivos + MAX_CAMPOS,
+                                             max_content_length=self.maxBytes * self.maxArquivos + MAX_TEXTO,
+                                             silent=False)
+            if sum(len(chave) + len(valor) for chave, valor in form.items(multi=True)) > MAX_TEXTO:
+                raise RequestEntityTooLarge("Campos do formulário maiores que o permitido.")
+            documentos = [self._publica(f.stream) for f in files.getlist("arquivo") if f.filename]
+        finally:
+            for arquivo in recebidos:
+                arquivo.descarta()
+        return form, documentos
+
+    def varreOrfaos(self):
+        """Apaga os arquivos que nenhum DocumentoSolicitacao referencia (upload
+        cuja gravação no banco falhou) e temporários esquecidos. Só considera
+        os parados há mais de orfaosSeg: um upload em andamento publica o
+        arquivo (ou renova a data de um que já existia) antes de gravar a
+        linha. Roda no processo trabalhador (ver trabalhador.py); devolve
+        quantos arquivos apagou."""
+        limite = time.time() - self.orfaosSeg
+        candidatos = {}   # hash -> caminho absoluto
+        apagados = 0
+        for raiz, _, nomes in os.walk(self.diretorio):
+            for nome in nomes:
+                caminho = os.path.join(raiz, nome)
+                if not _paradoDesde(caminho, limite):
+                    continue
+                if raiz == self.diretorioTemp:
+                    apagados += _apaga(caminho)
+                elif len(nome) == 64:
+                    candidatos[nome] = caminho
+
+        hashes = list(candidatos)
+        for i in range(0, len(hashes), 500):
+            lote = tuple(hashes[i:i + 500])
+            # no primário: a réplica pode não ter a linha recém-gravada
+            with Db().transaction() as tx:
+                referenciados = {h for (h,) in tx.consulta(
+                    "SELECT DISTINCT desHash FROM DocumentoSolicitacao WHERE desHash IN %s", (lote,))}
+            for hashArquivo in lote:
+                caminho = candidatos[hashArquivo]
+                # confere a data de novo: um upload pode ter reaproveitado o arquivo agora
+                if hashArquivo not in referenciados and _paradoDesde(caminho, limite):
+                    apagados += _apaga(caminho)
+        return apagados
+
+    def caminhoAbsoluto(self, desCaminho):
+        return os.path.join(self.diretorio, desCaminho)
+
+    def busca(self, idDocumento):
+        """RegistroDocumento (da memória ou de uma consulta), None se não
+        existir, ou a resposta de erro do Db. O conteúdo de um documento
+        nunca muda, então o registro não expira: as requisições seguintes
+        (ex.: cada Range do visualizador de PDF) não vão ao banco."""
+        with self._lock:
+            registro = self._registros.get(idDocumento)
+            if registro is not None:
+                self._registros.move_to_end(idDocumento)
+                return registro
+
+        sql = """
+            SELECT d.nomArquivo,
+                   d.desCaminho,
+                   d.desTipo,
+                   d.desHash,
+                   s.codUsuarioCPF
+              FROM DocumentoSolicitacao d
+              JOIN Solicitacao s ON s.idSolicitacao = d.idSolicitacao
+             WHERE d.idDocumento = %s
+        """
+        resultado = Db().execSql(sql, (idDocumento,), Mode.SELECT)
+        if not isinstance(resultado, list):
+            return resultado
+        if not resultado:
+            return None
+
+        registro = RegistroDocumento(*resultado[0])
+        with self._lock:
+            self._registros[idDocumento] = registro
+            if len(self._registros) > self.maxCache:
+                self._registros.popitem(last=False)
+        return registro
+
+    def envia(self, registro):
+        """Resposta com o arquivo: send_file entrega o arquivo ao servidor
+        (wsgi.file_wrapper / sendfile quando disponível), responde Range com
+        206 e If-None-Match / If-Modified-Since com 304."""
+        resposta = send_from_directory(self.diretorio, registro.desCaminho,
+                                       mimetype=registro.desTipo or "application/octet-stream",
+                                       download_name=registro.nomArquivo or "documento",
+                                       etag=registro.desHash or True,
+                                       conditional=True)
+        # documento de saúde: só o navegador do usuário guarda, nunca um cache compartilhado
+        resposta.cache_control.no_cache = None
+        resposta.cache_control.private = True
+        resposta.cache_control.max_age = self.maxAgeSeg
+        return resposta
+
+    def _publica(self, arquivo):
+        hashArquivo = arquivo.finaliza()
+        relativo = os.path.join(hashArquivo[:2], hashArquivo[2:4], hashArquivo)
+        destino = self.caminhoAbsoluto(relativo)
+        try:
+            # já existe (mesmo conteúdo): renova a data para a varredura de órfãos não apagá-lo
+            os.utime(destino)
+        except FileNotFoundError:
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(arquivo.caminhoTemp, destino)
+        return {
+            "nome": os.path.basename(arquivo.nomeOriginal.replace("\\", "/"))[:100],
+            "caminho": relativo,
+            "tipo": arquivo.tipo,
+            "bytes": arquivo.tamanho,
+            "hash": hashArquivo,
+        }
+
+
+armazemDocumentos = ArmazemDocumentos(**DOCUMENTOS)
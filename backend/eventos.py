@@ -0,0 +1,219 @@
+# eventos.py
+import collections
+import json
+import logging
+import os
+import queue
+import select
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from config import DB_CONFIG, EVENTOS
+
+
+class Evento:
+    __slots__ = ("id", "canais", "dados")
+
+    def __init__(self, id, canais, dados):
+        self.id = id
+        self.canais = canais      # frozenset: "cpf:<cpf>", "papel:A", "papel:G"
+        self.dados = dados        # JSON já serializado, sem o CPF
+
+    def sse(self):
+        return f"id: {self.id}\nevent: solicitacao\ndata: {self.dados}\n\n"
+
+
+RESET = "event: reset\ndata: {}\n\n"
+
+
+class Assinante:
+    __slots__ = ("canais", "fila", "atrasado")
+
+    def __init__(self, canais, maxBuffer):
+        self.canais = frozenset(canais)
+        self.fila = queue.Queue(maxBuffer)
+        self.atrasado = False
+
+
+"""
+    Um único LISTEN por processo, repassado aos clientes SSE.
+
+    Uma thread mantém uma conexão própria (fora do pool: o LISTEN prende a
+    sessão) escutando o canal do NOTIFY disparado pelo trigger de
+    Solicitacao. Cada evento vai para os assinantes cujos canais batem:
+    o cidadão assina "cpf:<cpf>", analista e gestor "papel:<papel>".
+
+    Cada assinante tem uma fila limitada (maxBufferCliente). Cliente lento
+    que enche a fila é desligado; o EventSource reconecta com o
+    Last-Event-ID e recebe o que faltou a partir do histórico recente. Se
+    o id já saiu do histórico, ou a escuta caiu e pode ter perdido
+    eventos, o cliente recebe "reset" e recarrega a lista inteira.
+    """
+class CentralEventos:
+    def __init__(self, canal="solicitacoes", heartbeatSeg=15, maxBufferCliente=100,
+                 historico=1000, maxAssinantes=500):
+        self.canal = canal
+        self.heartbeatSeg = heartbeatSeg
+        self.maxBufferCliente = maxBufferCliente
+        self.maxAssinantes = maxAssinantes
+        self._historico = collections.deque(maxlen=historico)
+        self._completoDesde = None     # eventos com id maior que este estão no histórico
+        self._assinantes = set()
+        self._metricas = collections.Counter()
+        self._lock = threading.Lock()
+        self._conectado = threading.Event()
+        self._thread = threading.Thread(target=self._escuta, name="eventos-listen", daemon=True)
+        self._thread.start()
+
+    def assina(self, canais, ultimoId=None):
+        """Registra um assinante. Devolve (assinante, textos SSE pendentes)
+        ou (None, None) se o limite de conexões foi atingido."""
+        self._conectado.wait(5)
+        with self._lock:
+            if len(self._assinantes) >= self.maxAssinantes:
+                self._metricas["recusados"] += 1
+                return None, None
+            assinante = Assinante(canais, self.maxBufferCliente)
+            pendentes = self._pendentes(assinante, ultimoId)
+            self._assinantes.add(assinante)
+            self._metricas["assinaturas"] += 1
+        return assinante, pendentes
+
+    def cancela(self, assinante):
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+    def estatisticas(self):
+        with self._lock:
+            return {"assinantes": len(self._assinantes),
+                    "historico": len(self._historico),
+                    "conectado": self._conectado.is_set(),
+                    **self._metricas}
+
+    def _pendentes(self, assinante, ultimoId):
+        # chamado com o lock: nada chega entre a leitura do histórico e o registro
+        if ultimoId is None:
+            return []
+        if self._completoDesde is None or ultimoId < self._completoDesde:
+            self._metricas["resets"] += 1
+            return [RESET]
+
+        eventos = list(self._historico)
+        for i, evento in enumerate(eventos):
+            if evento.id == ultimoId:
+                eventos = eventos[i + 1:]
+                break
+        else:
+            eventos = [e for e in eventos if e.id > ultimoId]
+        return [e.sse() for e in eventos if e.canais & assinante.canais]
+
+    def _publica(self, evento):
+        with self._lock:
+            if len(self._historico) == self._historico.maxlen:
+                self._completoDesde = max(self._completoDesde, self._historico[0].id)
+            self._historico.append(evento)
+            self._metricas["eventos"] += 1
+
+            for assinante in list(self._assinantes):
+                if not evento.canais & assinante.canais:
+                    continue
+                try:
+                    assinante.fila.put_nowait(evento.sse())
+                except queue.Full:
+                    # cliente lento: desliga; ele volta pelo Last-Event-ID
+                    assinante.atrasado = True
+                    self._assinantes.discard(assinante)
+                    self._metricas["desligadosPorAtraso"] += 1
+
+    def _reinicia(self, ultimoIdBanco):
+        # escuta (re)aberta: o que veio antes dela pode ter sido perdido
+        with self._lock:
+            self._historico.clear()
+            self._completoDesde = ultimoIdBanco
+            for assinante in self._assinantes:
+                try:
+                    assinante.fila.put_nowait(RESET)
+                except queue.Full:
+                    assinante.atrasado = True
+            self._assinantes = {a for a in self._assinantes if not a.atrasado}
+
+    def _escuta(self):
+        espera = 0.5
+        while True:
+            conn = None
+            try:
+                conn = psycopg2.connect(**DB_CONFIG)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.canal}")
+                    cursor.execute("SELECT CASE WHEN is_called THEN last_value ELSE 0 END FROM evento_solicitacao_seq")
+                    self._reinicia(cursor.fetchone()[0])
+                self._conectado.set()
+                espera = 0.5
+
+                while True:
+                    if select.select([conn], [], [], self.heartbeatSeg) == ([], [], []):
+                        # sem eventos: confirma que a conexão continua viva
+                        with conn.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._recebe(conn.notifies.pop(0).payload)
+            except Exception as e:
+                self._conectado.clear()
+                self._metricas["reconexoes"] += 1
+                logging.error("Escuta de eventos caiu, reconectando em %ss: %s", espera, e)
+                time.sleep(espera)
+                espera = min(espera * 2, 30)
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+
+    def _recebe(self, payload):
+        try:
+            dados = json.loads(payload)
+            cpf = dados.pop("cpf")
+            idEvento = int(dados.pop("id"))
+        except (ValueError, KeyError, TypeError) as e:
+            logging.error("Evento inválido ignorado: %s (%s)", payload, e)
+            return
+        canais = frozenset((f"cpf:{cpf}", "papel:A", "papel:G"))
+        self._publica(Evento(idEvento, canais, json.dumps(dados, ensure_ascii=False)))
+
+
+def transmite(central, assinante, pendentes):
+    """Gerador do corpo text/event-stream de um assinante."""
+    try:
+        yield "retry: 3000\n\n"
+        for texto in pendentes:
+            yield texto
+        while not assinante.atrasado or not assinante.fila.empty():
+            try:
+                yield assinante.fila.get(timeout=central.heartbeatSeg)
+            except queue.Empty:
+                yield ": ping\n\n"
+    finally:
+        # cliente desconectou (ou ficou para trás): sai da lista de assinantes
+        central.cancela(assinante)
+
+
+_central = None
+_centralPid = None
+_centralLock = threading.Lock()
+
+
+def getCentral():
+    global _central, _centralPid
+    if _central is None or _centralPid != os.getpid():
+        with _centralLock:
+            if _central is None or _centralPid != os.getpid():
+                _central = CentralEventos(**EVENTOS)
+                _centralPid = os.getpid()
+    return _central
@@ -0,0 +1,82 @@
+# historico.py
+import collections
+import threading
+import time
+
+from config import CACHE_HISTORICO
+
+
+"""
+    Cache por CPF do histórico de solicitações do cidadão, já serializado
+    em JSON (com ETag), com TTL e limite de itens (LRU).
+
+    criar_solicitacao e as rotas de avaliação chamam invalida(cpf) só para
+    os CPFs afetados. Para uma leitura que começou antes da invalidação não
+    gravar dados velhos, quem vai ao banco pega marca() antes da consulta e
+    a passa para guarda(), que recusa o valor se o CPF foi invalidado no
+    meio do caminho. Com vários workers a invalidação vale no processo que
+    alterou; nos outros o TTL limita o atraso.
+    """
+class CacheHistorico:
+    def __init__(self, ttlSeg=60, maxItens=10000):
+        self.ttlSeg = ttlSeg
+        self.maxItens = maxItens
+        self._itens = collections.OrderedDict()   # cpf -> (corpo, etag, válido até)
+        self._invalidadoEm = {}                   # cpf -> (geração, instante)
+        self._geracao = 0
+        self._metricas = collections.Counter()
+        self._lock = threading.Lock()
+
+    def obter(self, cpf):
+        """(corpo, etag) do CPF, ou None."""
+        with self._lock:
+            item = self._itens.get(cpf)
+            if item is None or item[2] < time.monotonic():
+                if item is not None:
+                    del self._itens[cpf]
+                self._metricas["misses"] += 1
+                return None
+            self._itens.move_to_end(cpf)
+            self._metricas["hits"] += 1
+            return item[0], item[1]
+
+    def marca(self):
+        with self._lock:
+            return self._geracao
+
+    def guarda(self, cpf, corpo, etag, marca):
+        with self._lock:
+            invalidado = self._invalidadoEm.get(cpf)
+            if invalidado is not None and invalidado[0] > marca:
+                self._metricas["descartados"] += 1
+                return
+            self._itens[cpf] = (corpo, etag, time.monotonic() + self.ttlSeg)
+            self._itens.move_to_end(cpf)
+            if len(self._itens) > self.maxItens:
+                self._itens.popitem(last=False)
+
+    def invalida(self, *cpfs):
+        agora = time.monotonic()
+        with self._lock:
+            self._geracao += 1
+            for cpf in cpfs:
+                if not cpf:
+                    continue
+                cpf = cpf.strip()
+                self._itens.pop(cpf, None)
+                self._invalidadoEm[cpf] = (self._geracao, agora)
+                self._metricas["invalidacoes"] += 1
+            if len(self._invalidadoEm) > self.maxItens:
+                # só leituras em andamento precisam da marca; as antigas podem sair
+                limite = agora - self.ttlSeg
+                self._invalidadoEm = {c: v for c, v in self._invalidadoEm.items() if v[1] >= limite}
+
+    def estatisticas(self):
+        with self._lock:
+            consultas = self._metricas["hits"] + self._metricas["misses"]
+            return {"itens": len(self._itens),
+                    "taxaAcerto": round(self._metricas["hits"] / consultas, 4) if consultas else None,
+                    **self._metricas}
+
+
+cacheHistorico = CacheHistorico(**CACHE_HISTORICO)
@@ -0,0 +1,148 @@
+# importacao.py
+import codecs
+import csv
+import itertools
+
+from db import Db, Mode
+from util import normaliza
+
+
+"""
+    Lê o CSV de medicamentos (nome e dosagem) linha a linha e devolve
+    só as linhas válidas, como (linha, nome, dosagem), para o COPY.
+
+    O arquivo nunca é carregado inteiro: cada linha é decodificada,
+    validada e entregue ao PostgreSQL. Dos erros, só os maxErros
+    primeiros são guardados (com o número da linha); os demais apenas
+    contados. Aceita ',' ou ';' como separador (detectado na primeira
+    linha) e um cabeçalho opcional.
+    """
+class LeitorMedicamentosCsv:
+    CABECALHOS = {"nome", "nommedicamento", "medicamento"}
+
+    def __init__(self, arquivo, maxErros=100):
+        self.arquivo = arquivo
+        self.maxErros = maxErros
+        self.qtdLinhas = 0
+        self.qtdValidas = 0
+        self.qtdErros = 0
+        self.erros = []
+
+    def __iter__(self):
+        texto = codecs.getreader("utf-8-sig")(self.arquivo, errors="replace")
+        primeira = texto.readline()
+        separador = ";" if primeira.count(";") > primeira.count(",") else ","
+        leitor = csv.reader(itertools.chain([primeira], texto), delimiter=separador)
+
+        while True:
+            try:
+                campos = next(leitor)
+            except StopIteration:
+                return
+            except csv.Error as e:
+                self._erro(leitor.line_num, f"Linha mal formada: {e}")
+                continue
+
+            if not any(c.strip() for c in campos):
+                continue
+            if leitor.line_num == 1 and normaliza(campos[0]).replace(" ", "") in self.CABECALHOS:
+                continue
+
+            self.qtdLinhas += 1
+            linha = self._valida(leitor.line_num, campos)
+            if linha is not None:
+                self.qtdValidas += 1
+                yield linha
+
+    def _valida(self, numero, campos):
+        if len(campos) != 2:
+            return self._erro(numero, f"Esperadas 2 colunas (nome e dosagem), encontradas {len(campos)}")
+
+        nome, dosagem = campos[0].strip(), campos[1].strip()
+        if not nome or not dosagem:
+            return self._erro(numero, "Nome e dosagem são obrigatórios")
+        if len(nome) > 100:
+            return self._erro(numero, "Nome com mais de 100 caracteres")
+        if len(dosagem) > 50:
+            return self._erro(numero, "Dosagem com mais de 50 caracteres")
+        if "\ufffd" in nome or "\ufffd" in dosagem:
+            return self._erro(numero, "Texto com caracteres inválidos (o arquivo deve estar em UTF-8)")
+        return numero, nome, dosagem
+
+    def _erro(self, numero, mensagem):
+        self.qtdErros += 1
+        if len(self.erros) < self.maxErros:
+            self.erros.append({"linha": numero, "mensagem": mensagem})
+        return None
+
+
+SQL_TEMPORARIA = """
+    CREATE TEMP TABLE importa_medicamento (
+        linha INTEGER,
+        nome VARCHAR(100),
+        dosagem VARCHAR(50)
+    )
+"""
+
+# nome + dosagem (sem diferenciar maiúsculas) identificam o medicamento:
+# existente inativo é reativado, inexistente é inserido. Repetido no
+# arquivo vale a última linha. O LOCK impede que duas importações
+# simultâneas insiram o mesmo medicamento.
+SQL_MERGE = """
+    LOCK TABLE Medicamento IN SHARE ROW EXCLUSIVE MODE;
+    WITH entrada AS (
+        SELECT DISTINCT ON (lower(nome), lower(dosagem)) nome, dosagem
+          FROM importa_medicamento
+         ORDER BY lower(nome), lower(dosagem), linha DESC
+    ), reativados AS (
+        UPDATE Medicamento m SET idtAtivo = true
+          FROM entrada e
+         WHERE lower(m.nomMedicamento) = lower(e.nome)
+           AND lower(coalesce(m.desDosagem, '')) = lower(e.dosagem)
+           AND m.idtAtivo IS NOT TRUE
+        RETURNING m.idMedicamento
+    ), inseridos AS (
+        INSERT INTO Medicamento (nomMedicamento, desDosagem, idtAtivo)
+        SELECT e.nome, e.dosagem, true
+          FROM entrada e
+         WHERE NOT EXISTS (SELECT 1 FROM Medicamento m
+                            WHERE lower(m.nomMedicamento) = lower(e.nome)
+                              AND lower(coalesce(m.desDosagem, '')) = lower(e.dosagem))
+        RETURNING idMedicamento
+    )
+    SELECT (SELECT count(*) FROM entrada),
+           (SELECT count(*) FROM inseridos),
+           (SELECT count(*) FROM reativados)
+"""
+
+
+def importaMedicamentos(leitor: LeitorMedicamentosCsv):
+    """COPY das linhas válidas para uma tabela temporária e merge em
+    Medicamento, tudo em uma transação. Devolve o resumo (dict) ou a
+    resposta de erro do Db."""
+    db = Db()
+    resposta = db.execSql(SQL_TEMPORARIA, mode=Mode.BEGIN)
+    if resposta == '':
+        resposta = db.execCopy("importa_medicamento", ["linha", "nome", "dosagem"], leitor)
+    if resposta != '':
+        return resposta
+
+    resultado = db.execSql(SQL_MERGE, mode=Mode.SELECT)
+    if not isinstance(resultado, list):
+        return resultado
+
+    resposta = db.execSql("DROP TABLE importa_medicamento", mode=Mode.COMMIT)
+    if db.tipo == "ERRO":
+        return resposta
+
+    distintos, inseridos, reativados = resultado[0]
+    return {
+        "linhas": leitor.qtdLinhas,
+        "validas": leitor.qtdValidas,
+        "repetidasNoArquivo": leitor.qtdValidas - distintos,
+        "inseridos": inseridos,
+        "reativados": reativados,
+        "jaCadastrados": distintos - inseridos - reativados,
+        "qtdErros": leitor.qtdErros,
+        "erros": leitor.erros,
+    }
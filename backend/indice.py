@@ -0,0 +1,139 @@
+# indice.py
+import bisect
+import threading
+
+from catalogo import catalogo
+from util import normaliza
+
+
+"""
+    Índice em memória para o autocomplete de medicamentos.
+
+    Dois vetores ordenados, consultados com bisect:
+      - _nomes: (nome normalizado + dosagem, id) -> prefixo do nome inteiro
+        ("insul" acha "Insulina Regular"), já em ordem alfabética;
+      - _tokens: (palavra, id) de nome e dosagem -> prefixo de qualquer
+        palavra ("regul", "100ui").
+    Consultas com várias palavras usam a mais seletiva (menos tokens com
+    aquele prefixo) para achar os candidatos e filtram pelas demais. O trabalho por consulta é limitado
+    (limite resultados, no máximo maxCandidatos tokens examinados), então o
+    tempo não cresce com o tamanho do catálogo.
+
+    O índice acompanha o catálogo: reconstrói tudo quando o catálogo é
+    relido do banco e é atualizado item a item em adiciona/remove.
+    """
+class IndiceMedicamentos:
+    def __init__(self, maxCandidatos=200):
+        self.maxCandidatos = maxCandidatos
+        self._nomes = []
+        self._tokens = []
+        self._itens = {}      # id -> (item, palavras, chave do nome)
+        self._lock = threading.Lock()
+
+    def reconstroi(self, itens):
+        nomes = []
+        tokens = []
+        porId = {}
+        for item in itens:
+            chaveNome, palavras = self._chaves(item)
+            porId[item["id"]] = (item, palavras, chaveNome)
+            nomes.append((chaveNome, item["id"]))
+            tokens.extend((palavra, item["id"]) for palavra in palavras)
+        nomes.sort()
+        tokens.sort()
+        with self._lock:
+            self._nomes, self._tokens, self._itens = nomes, tokens, porId
+
+    def adiciona(self, item):
+        chaveNome, palavras = self._chaves(item)
+        with self._lock:
+            self._remove(item["id"])
+            self._itens[item["id"]] = (item, palavras, chaveNome)
+            bisect.insort(self._nomes, (chaveNome, item["id"]))
+            for palavra in palavras:
+                bisect.insort(self._tokens, (palavra, item["id"]))
+
+    def remove(self, idMedicamento):
+        with self._lock:
+            self._remove(idMedicamento)
+
+    def busca(self, texto, limite=10):
+        termos = normaliza(texto).split()
+        if not termos:
+            return []
+
+        consulta = " ".join(termos)
+        with self._lock:
+            resultado = []
+            vistos = set()
+
+            # 1) nome começando com o texto digitado
+            i = bisect.bisect_left(self._nomes, (consulta,))
+            while i < len(self._nomes) and len(resultado) < limite:
+                chave, idMed = self._nomes[i]
+                if not chave.startswith(consulta):
+                    break
+                resultado.append(self._itens[idMed][0])
+                vistos.add(idMed)
+                i += 1
+
+            if len(resultado) >= limite:
+                return resultado
+
+            # 2) todas as palavras digitadas são prefixo de alguma palavra do item;
+            #    os tokens estão em ordem, então as palavras mais próximas do texto vêm antes
+            # o guia é o termo com menos tokens (menor faixa do bisect); um termo
+            # sem nenhum token encerra a busca sem examinar nada
+            faixas = []
+            for termo in termos:
+                inicio = bisect.bisect_left(self._tokens, (termo,))
+                fim = bisect.bisect_left(self._tokens, (termo + "\x7f",))   # depois de [a-z0-9]
+                if inicio == fim:
+                    return resultado
+                faixas.append((fim - inicio, inicio, fim, termo))
+            _, i, fim, guia = min(faixas)
+            # " termo" dentro de " chave do nome": alguma palavra começa com o termo
+            outros = [" " + t for t in termos if t is not guia]
+            candidatos = []
+            examinados = 0
+            falta = limite - len(resultado)
+            while i < fim and examinados < self.maxCandidatos and len(candidatos) < falta:
+                _, idMed = self._tokens[i]
+                examinados += 1
+                i += 1
+                if idMed in vistos:
+                    continue
+                item, _, chaveNome = self._itens[idMed]
+                texto = " " + chaveNome
+                if all(t in texto for t in outros):
+                    vistos.add(idMed)
+                    candidatos.append((chaveNome, item))
+
+            candidatos.sort(key=lambda par: par[0])
+            resultado.extend(item for _, item in candidatos)
+            return resultado
+
+    def _chaves(self, item):
+        nome = normaliza(item["nome"])
+        dosagem = normaliza(item.get("dosagem"))
+        chaveNome = f"{nome} {dosagem}".strip()
+        return chaveNome, tuple(dict.fromkeys(chaveNome.split()))
+
+    def _remove(self, idMedicamento):
+        registro = self._itens.pop(idMedicamento, None)
+        if registro is None:
+            return
+        _, palavras, chaveNome = registro
+        self._descarta(self._nomes, (chaveNome, idMedicamento))
+        for palavra in palavras:
+            self._descarta(self._tokens, (palavra, idMedicamento))
+
+    @staticmethod
+    def _descarta(vetor, chave):
+        i = bisect.bisect_left(vetor, chave)
+        if i < len(vetor) and vetor[i] == chave:
+            del vetor[i]
+
+
+indiceMedicamentos = IndiceMedicamentos()
+catalogo.ouvintes.append(indiceMedicamentos)
@@ -0,0 +1,118 @@
+# limitador.py
+import collections
+import functools
+import math
+import threading
+import time
+
+from flask import jsonify, request
+from config import LIMITES
+
+
+"""
+    Token bucket em memória por chave (IP, CPF...).
+
+    Cada chave tem até `capacidade` fichas, repostas a `taxaPorSeg`; cada
+    requisição gasta uma. As chaves ficam em ordem de uso: as paradas há
+    mais de ociosoSeg (balde já cheio de novo) e as excedentes a maxChaves
+    são descartadas, então a memória fica limitada mesmo sob varredura.
+    """
+class LimitadorTokens:
+    def __init__(self, nome, capacidade, taxaPorSeg, maxChaves=100000, ociosoSeg=600):
+        self.nome = nome
+        self.capacidade = capacidade
+        self.taxaPorSeg = taxaPorSeg
+        self.maxChaves = maxChaves
+        self.ociosoSeg = ociosoSeg
+        self._baldes = collections.OrderedDict()   # chave -> [fichas, último acesso]
+        self._lock = threading.Lock()
+        self._contadores = collections.Counter()
+
+    def permite(self, chave):
+        """Devolve (permitido, segundos até a próxima ficha)."""
+        agora = time.monotonic()
+        with self._lock:
+            balde = self._baldes.get(chave)
+            if balde is None:
+                balde = self._baldes[chave] = [float(self.capacidade), agora]
+            else:
+                balde[0] = min(self.capacidade, balde[0] + (agora - balde[1]) * self.taxaPorSeg)
+                balde[1] = agora
+                self._baldes.move_to_end(chave)
+
+            self._descartaOciosos(agora)
+
+            if balde[0] >= 1:
+                balde[0] -= 1
+                self._contadores["permitidas"] += 1
+                return True, 0.0
+
+            self._contadores["recusadas"] += 1
+            return False, (1 - balde[0]) / self.taxaPorSeg
+
+    def estatisticas(self):
+        with self._lock:
+            stats = dict(self._contadores)
+            stats.update({
+                "chaves": len(self._baldes),
+                "capacidade": self.capacidade,
+                "taxaPorSeg": self.taxaPorSeg,
+            })
+        return stats
+
+    def _descartaOciosos(self, agora):
+        # as mais antigas ficam no início; para no primeiro balde ainda ativo
+        while self._baldes:
+            chave, (_, ultimo) = next(iter(self._baldes.items()))
+            if len(self._baldes) <= self.maxChaves and agora - ultimo < self.ociosoSeg:
+                break
+            del self._baldes[chave]
+            self._contadores["descartadas"] += 1
+
+
+limitadores = {
+    nome: LimitadorTokens(nome, maxChaves=LIMITES["maxChaves"], ociosoSeg=LIMITES["ociosoSeg"], **LIMITES[nome])
+    for nome in ("loginIp", "loginCpf")
+}
+
+
+def ipCliente():
+    # atrás de proxy depende do ProxyFix (PROXY["saltos"] em config.py); sem ele,
+    # todos os clientes chegariam com o IP do proxy e dividiriam um só limite
+    return request.remote_addr or "desconhecido"
+
+
+def cpfRequisicao():
+    # CPF da URL (/loginAcesso/<codUsuarioCPF>) ou do corpo JSON
+    cpf = (request.view_args or {}).get("codUsuarioCPF")
+    if cpf is None:
+        dados = request.get_json(silent=True) or {}
+        cpf = dados.get("codUsuarioCPF")
+    return str(cpf).strip() if cpf else None
+
+
+"""
+    Aplica os limitadores à rota:
+
+        @limita(("loginIp", ipCliente), ("loginCpf", cpfRequisicao))
+
+    Estourado qualquer um, responde 429 com Retry-After sem executar a rota.
+    """
+def limita(*regras):
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolve(*args, **kwargs):
+            for nome, funcaoChave in regras:
+                chave = funcaoChave()
+                if chave is None:
+                    continue
+                permitido, espera = limitadores[nome].permite(chave)
+                if not permitido:
+                    resposta = jsonify({"tipo": "ERRO",
+                                        "mensagem": ["Muitas tentativas. Aguarde alguns instantes e tente novamente."]})
+                    resposta.status_code = 429
+                    resposta.headers["Retry-After"] = str(max(1, math.ceil(espera)))
+                    return resposta
+            return funcao(*args, **kwargs)
+        return envolve
+    return decorador
@@ -0,0 +1,116 @@
+# metricas.py
+import bisect
+import functools
+import json
+import logging
+import re
+import threading
+import time
+
+from config import DB_METRICAS
+
+# limites (ms) das faixas do histograma de duração
+FAIXAS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+_reLiteral = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_reEspacos = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=1024)
+def normalizaSql(sql):
+    # os SQLs das rotas são constantes, então o cache evita refazer as regex
+    sql = _reLiteral.sub("?", sql)
+    return _reEspacos.sub(" ", sql).strip()
+
+
+class EstatisticaConsulta:
+    __slots__ = ("chamadas", "totalMs", "maxMs", "linhas", "esperaMs", "faixas")
+
+    def __init__(self):
+        self.chamadas = 0
+        self.totalMs = 0.0
+        self.maxMs = 0.0
+        self.linhas = 0
+        self.esperaMs = 0.0
+        self.faixas = [0] * (len(FAIXAS_MS) + 1)
+
+    def paraDict(self, sql):
+        histograma = {f"<={limite}ms": qtd for limite, qtd in zip(FAIXAS_MS, self.faixas)}
+        histograma[f">{FAIXAS_MS[-1]}ms"] = self.faixas[-1]
+        return {
+            "sql": sql,
+            "chamadas": self.chamadas,
+            "totalMs": round(self.totalMs, 3),
+            "mediaMs": round(self.totalMs / self.chamadas, 3) if self.chamadas else 0,
+            "maxMs": round(self.maxMs, 3),
+            "linhas": self.linhas,
+            "esperaConexaoMs": round(self.esperaMs, 3),
+            "histograma": histograma,
+        }
+
+
+"""
+    Acumula, em memória, tempo de execução, linhas retornadas e tempo de
+    espera por conexão de cada SQL (normalizado) executado pelo Db.
+    Consultas acima de limiteLentaMs vão para o log de consultas lentas,
+    uma linha JSON por ocorrência.
+    """
+class MetricasDb:
+    def __init__(self, ativo=True, limiteLentaMs=200, arquivoLentas=None, maxConsultas=500):
+        self.ativo = ativo
+        self.limiteLentaMs = limiteLentaMs
+        self.maxConsultas = maxConsultas
+        self._consultas = {}
+        self._lock = threading.Lock()
+
+        self._logLentas = logging.getLogger("consultas_lentas")
+        self._logLentas.propagate = False
+        if arquivoLentas and not self._logLentas.handlers:
+            handler = logging.FileHandler(arquivoLentas)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logLentas.addHandler(handler)
+            self._logLentas.setLevel(logging.INFO)
+
+    def registra(self, sql, duracaoMs, linhas=0, esperaMs=0.0):
+        if not self.ativo:
+            return
+
+        chave = normalizaSql(sql)
+        with self._lock:
+            est = self._consultas.get(chave)
+            if est is None:
+                if len(self._consultas) >= self.maxConsultas:
+                    # SQL dinâmico demais: não deixa o dicionário crescer sem limite
+                    chave = "(outros)"
+                    est = self._consultas.get(chave)
+                if est is None:
+                    est = self._consultas[chave] = EstatisticaConsulta()
+            est.chamadas += 1
+            est.totalMs += duracaoMs
+            est.linhas += max(linhas, 0)
+            est.esperaMs += esperaMs
+            if duracaoMs > est.maxMs:
+                est.maxMs = duracaoMs
+            est.faixas[bisect.bisect_left(FAIXAS_MS, duracaoMs)] += 1
+
+        if duracaoMs >= self.limiteLentaMs:
+            self._logLentas.info(json.dumps({
+                "instante": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "sql": chave,
+                "duracaoMs": round(duracaoMs, 3),
+                "linhas": linhas,
+                "esperaConexaoMs": round(esperaMs, 3),
+            }, ensure_ascii=False))
+
+    def top(self, n=10, ordem="totalMs"):
+        with self._lock:
+            itens = [est.paraDict(sql) for sql, est in self._consultas.items()]
+        itens.sort(key=lambda item: item.get(ordem, 0), reverse=True)
+        return itens[:n]
+
+    def limpa(self):
+        with self._lock:
+            self._consultas.clear()
+
+
+metricasDb = MetricasDb(**DB_METRICAS)
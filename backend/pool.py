@@ -0,0 +1,207 @@
+# pool.py
+import collections
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from config import DB_CONFIG, DB_POOL
+
+
+class Conexao(psycopg2.extensions.connection):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # comandos preparados nesta sessão, em ordem de uso (ver preparados.py)
+        self.preparados = collections.OrderedDict()
+
+
+class PoolEsgotado(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo de espera configurado."""
+
+
+"""
+    Pool de conexões compartilhado pelo processo.
+
+    Mantém entre minconn e maxconn conexões abertas com o PostgreSQL.
+    Na retirada verifica a saúde da conexão (fechada ou ociosa há muito
+    tempo -> SELECT 1) e, se preciso, reconecta com backoff exponencial.
+    Quando todas as conexões estão em uso, aguarda até timeoutEspera
+    segundos antes de levantar PoolEsgotado.
+    """
+class PoolConexoes:
+    def __init__(self, dbConfig: dict, minconn: int=1, maxconn: int=10,
+                 timeoutEspera: float=5, tentativasConexao: int=3,
+                 backoffInicial: float=0.2, intervaloVerificacao: float=30):
+        if minconn < 0 or maxconn < 1 or minconn > maxconn:
+            raise ValueError(f"Tamanho de pool inválido: min={minconn} max={maxconn}")
+
+        self.dbConfig = dbConfig
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeoutEspera = timeoutEspera
+        self.tentativasConexao = max(1, tentativasConexao)
+        self.backoffInicial = backoffInicial
+        self.intervaloVerificacao = intervaloVerificacao
+
+        self._livres = collections.deque()   # (conn, instante em que foi devolvida)
+        self._emUso = set()
+        self._total = 0
+        self._cond = threading.Condition()
+        self._metricas = collections.Counter()
+
+        for _ in range(minconn):
+            self._total += 1
+            self._livres.append((self._conecta(), time.monotonic()))
+
+    def obter(self, timeout: float=None):
+        # timeout menor que o configurado: ex. o que resta do prazo da rota
+        inicio = time.monotonic()
+        espera = self.timeoutEspera if timeout is None else min(timeout, self.timeoutEspera)
+        limite = inicio + espera
+        esperou = False
+
+        while True:
+            conn = None
+            criar = False
+            with self._cond:
+                while not self._livres and self._total >= self.maxconn:
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._metricas["esgotamentos"] += 1
+                        logging.error("Pool de conexões esgotado (%s em uso)", len(self._emUso))
+                        raise PoolEsgotado(f"Nenhuma conexão livre após {espera:.3f}s "
+                                           f"({self.maxconn} conexões em uso)")
+                    esperou = True
+                    self._cond.wait(restante)
+
+                if self._livres:
+                    conn, devolvidaEm = self._livres.pop()
+                else:
+                    self._total += 1
+                    criar = True
+
+            if criar:
+                try:
+                    conn = self._conecta()
+                except Exception:
+                    with self._cond:
+                        self._total -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._saudavel(conn, devolvidaEm):
+                self._descarta(conn)
+                continue
+
+            with self._cond:
+                self._emUso.add(conn)
+                self._metricas["retiradas"] += 1
+                if esperou:
+                    self._metricas["esperas"] += 1
+                self._metricas["tempoEsperaMs"] += int((time.monotonic() - inicio) * 1000)
+            return conn
+
+    def devolver(self, conn, descartar: bool=False):
+        if conn is None:
+            return
+
+        with self._cond:
+            self._emUso.discard(conn)
+
+        if not descartar and not conn.closed:
+            try:
+                # conexão devolvida no meio de uma transação volta limpa para o pool
+                if conn.get_transaction_status() != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except Exception:
+                descartar = True
+
+        if descartar or conn.closed:
+            self._descarta(conn)
+            return
+
+        with self._cond:
+            self._livres.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def fechar(self):
+        with self._cond:
+            while self._livres:
+                conn, _ = self._livres.pop()
+                self._total -= 1
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._cond.notify_all()
+
+    def estatisticas(self):
+        with self._cond:
+            stats = dict(self._metricas)
+            stats.update({
+                "total": self._total,
+                "emUso": len(self._emUso),
+                "livres": len(self._livres),
+                "minconn": self.minconn,
+                "maxconn": self.maxconn,
+            })
+        return stats
+
+    def _conecta(self):
+        espera = self.backoffInicial
+        for tentativa in range(1, self.tentativasConexao + 1):
+            try:
+                conn = psycopg2.connect(connection_factory=Conexao, **self.dbConfig)
+                self._metricas["conexoesCriadas"] += 1
+                return conn
+            except psycopg2.OperationalError as e:
+                self._metricas["falhasConexao"] += 1
+                logging.error("Falha ao conectar (tentativa %s/%s): %s",
+                              tentativa, self.tentativasConexao, e)
+                if tentativa == self.tentativasConexao:
+                    raise
+                time.sleep(espera)
+                espera *= 2
+
+    def _saudavel(self, conn, devolvidaEm):
+        if conn.closed:
+            return False
+
+        if time.monotonic() - devolvidaEm < self.intervaloVerificacao:
+            return True
+
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except Exception as e:
+            logging.error("Conexão do pool descartada na verificação: %s", e)
+            return False
+
+    def _descarta(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._total -= 1
+            self._metricas["conexoesDescartadas"] += 1
+            self._cond.notify()
+
+
+_pool = None
+_poolPid = None
+_poolLock = threading.Lock()
+
+
+def getPool():
+    # recria o pool quando o processo é um fork (ex.: workers do gunicorn)
+    global _pool, _poolPid
+    if _pool is None or _poolPid != os.getpid():
+        with _poolLock:
+            if _pool is None or _poolPid != os.getpid():
+                _pool = PoolConexoes(DB_CONFIG, **DB_POOL)
+                _poolPid = os.getpid()
+    return _pool
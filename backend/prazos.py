@@ -0,0 +1,92 @@
+# prazos.py
+import functools
+import inspect
+import time
+
+from flask import g, has_request_context, jsonify
+
+
+class PrazoEsgotado(Exception):
+    """O orçamento de tempo da requisição acabou antes do comando SQL."""
+
+
+"""
+    Prazo (deadline) por rota:
+
+        @solicitacoes_bp.route('/listar_solicitacoes', methods=['GET'])
+        @prazo(5000)
+        def listar_solicitacoes(): ...
+
+    O Db consulta o tempo restante antes de cada comando e o envia ao
+    PostgreSQL como statement_timeout (SET LOCAL), então uma consulta que
+    passa do prazo é cancelada no servidor. Quando isso acontece a rota
+    responde 503 com o envelope {tipo, mensagem}, sem segurar o worker.
+    """
+def prazo(ms):
+    def decorador(funcao):
+        if inspect.iscoroutinefunction(funcao):
+            @functools.wraps(funcao)
+            async def envolveAsync(*args, **kwargs):
+                _inicia(ms)
+                try:
+                    resposta = await funcao(*args, **kwargs)
+                except PrazoEsgotado:
+                    return respostaEstouro()
+                return _verifica(resposta)
+            return envolveAsync
+
+        @functools.wraps(funcao)
+        def envolve(*args, **kwargs):
+            _inicia(ms)
+            try:
+                resposta = funcao(*args, **kwargs)
+            except PrazoEsgotado:
+                return respostaEstouro()
+            return _verifica(resposta)
+        return envolve
+    return decorador
+
+
+def restanteMs():
+    """Milissegundos restantes do prazo da requisição atual (None = sem prazo)."""
+    if not has_request_context():
+        return None
+    limite = g.get("prazoLimite")
+    if limite is None:
+        return None
+    return (limite - time.monotonic()) * 1000
+
+
+def comandoTimeout():
+    """SET LOCAL do statement_timeout para o tempo restante (None = sem prazo).
+    Levanta PrazoEsgotado se o prazo já acabou."""
+    restante = restanteMs()
+    if restante is None:
+        return None
+    if restante < 1:
+        marcaEstouro()
+        raise PrazoEsgotado("Prazo da requisição esgotado antes de executar o SQL")
+    return f"SET LOCAL statement_timeout = {int(restante)}"
+
+
+def marcaEstouro():
+    if has_request_context():
+        g.prazoEstourado = True
+
+
+def respostaEstouro():
+    return jsonify({"tipo": "ERRO", "mensagem": ["Tempo limite da requisição excedido. Tente novamente."]}), 503
+
+
+def _inicia(ms):
+    limite = time.monotonic() + ms / 1000
+    # prazo mais externo continua valendo se for menor
+    atual = g.get("prazoLimite")
+    g.prazoLimite = limite if atual is None else min(atual, limite)
+    g.prazoEstourado = False
+
+
+def _verifica(resposta):
+    if g.get("prazoEstourado"):
+        return respostaEstouro()
+    return resposta
@@ -0,0 +1,112 @@
+# preparados.py
+import hashlib
+import logging
+import re
+import threading
+
+from config import DB_PREPARADOS
+
+_rePlaceholder = re.compile(r"%%|%s")
+
+
+def converteParametros(sql):
+    """Troca os placeholders do psycopg2 (%s) pelos do PREPARE ($1, $2...).
+    Devolve o SQL convertido e a quantidade de parâmetros."""
+    qtd = 0
+
+    def troca(m):
+        nonlocal qtd
+        if m.group(0) == "%%":
+            return "%"
+        qtd += 1
+        return f"${qtd}"
+
+    return _rePlaceholder.sub(troca, sql), qtd
+
+
+"""
+    Prepara no servidor (PREPARE) os SQLs executados com frequência e
+    passa a executá-los com EXECUTE, evitando que o PostgreSQL refaça o
+    parse e o plano a cada requisição.
+
+    Os nomes preparados ficam em conn.preparados (um LRU por conexão do
+    pool, ver pool.Conexao). Conexão nova ou reciclada começa com o cache
+    vazio; ao passar de maxPorConexao o menos usado recebe DEALLOCATE.
+    """
+class CachePreparados:
+    def __init__(self, ativo=True, minUsos=3, maxPorConexao=50):
+        self.ativo = ativo
+        self.minUsos = minUsos
+        self.maxPorConexao = maxPorConexao
+        self._usos = {}
+        self._naoPreparaveis = set()
+        self._lock = threading.Lock()
+
+    def traduz(self, conn, cursor, sql, params):
+        """Devolve o (sql, params) que deve ser executado no cursor."""
+        if not self.ativo or not isinstance(params, (tuple, list, type(None))):
+            return sql, params
+
+        cache = getattr(conn, "preparados", None)
+        if cache is None:
+            return sql, params
+
+        nome = cache.get(sql)
+        if nome is not None:
+            cache.move_to_end(sql)
+            return self._comandoExecute(nome, params), params
+
+        if not self._frequente(sql):
+            return sql, params
+
+        texto, qtd = converteParametros(sql)
+        if qtd != len(params or ()):
+            return sql, params
+
+        nome = "prep_" + hashlib.md5(sql.encode("utf-8")).hexdigest()[:20]
+        try:
+            # savepoint: se o PREPARE falhar a transação da rota continua válida
+            cursor.execute("SAVEPOINT prepara")
+            cursor.execute(f"PREPARE {nome} AS {texto}")
+            cursor.execute("RELEASE SAVEPOINT prepara")
+        except Exception as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT prepara")
+            logging.error("SQL não pôde ser preparado: %s", e)
+            with self._lock:
+                self._naoPreparaveis.add(sql)
+            return sql, params
+
+        cache[sql] = nome
+        if len(cache) > self.maxPorConexao:
+            _, nomeVelho = cache.popitem(last=False)
+            cursor.execute(f"DEALLOCATE {nomeVelho}")
+
+        return self._comandoExecute(nome, params), params
+
+    def invalida(self, conn):
+        cache = getattr(conn, "preparados", None)
+        if cache is not None:
+            cache.clear()
+
+    def _frequente(self, sql):
+        # SQL com mais de um comando não pode ser preparado
+        if ";" in sql.strip().rstrip(";"):
+            return False
+
+        with self._lock:
+            if sql in self._naoPreparaveis:
+                return False
+            if len(self._usos) > 5000:
+                # SQL montado dinamicamente: recomeça a contagem
+                self._usos.clear()
+            usos = self._usos.get(sql, 0) + 1
+            self._usos[sql] = usos
+        return usos >= self.minUsos
+
+    def _comandoExecute(self, nome, params):
+        if not params:
+            return f"EXECUTE {nome}"
+        return f"EXECUTE {nome} ({', '.join(['%s'] * len(params))})"
+
+
+cachePreparados = CachePreparados(**DB_PREPARADOS)
@@ -0,0 +1,114 @@
+# replicas.py
+import itertools
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from config import DB_POOL, DB_REPLICAS, DB_REPLICAS_OPCOES
+from pool import PoolConexoes
+
+
+"""
+    Distribui as leituras entre as réplicas em round-robin.
+
+    Cada réplica tem seu próprio PoolConexoes. Uma réplica que falha ao
+    conectar ou derruba a conexão no meio de uma consulta é ejetada por
+    tempoEjecao segundos; sem réplica disponível a leitura vai para o
+    primário.
+    """
+class RoteadorReplicas:
+    def __init__(self, replicas: list, tempoEjecao: float=30, **opcoesPool):
+        self.pools = [PoolConexoes(dsn, **opcoesPool) for dsn in replicas]
+        self.tempoEjecao = tempoEjecao
+        self._ejetadaAte = {id(pool): 0.0 for pool in self.pools}
+        self._proxima = itertools.count()
+        self._lock = threading.Lock()
+
+    def poolLeitura(self):
+        if not self.pools:
+            return None
+
+        agora = time.monotonic()
+        with self._lock:
+            for _ in range(len(self.pools)):
+                pool = self.pools[next(self._proxima) % len(self.pools)]
+                if self._ejetadaAte[id(pool)] <= agora:
+                    return pool
+        return None
+
+    def ejeta(self, pool, motivo=None):
+        if id(pool) not in self._ejetadaAte:
+            return  # pool do primário
+
+        with self._lock:
+            self._ejetadaAte[id(pool)] = time.monotonic() + self.tempoEjecao
+        logging.error("Réplica %s ejetada por %ss: %s",
+                      pool.dbConfig.get("host"), self.tempoEjecao, motivo)
+
+    def estatisticas(self):
+        agora = time.monotonic()
+        return [{
+            "host": pool.dbConfig.get("host"),
+            "port": pool.dbConfig.get("port"),
+            "ejetada": self._ejetadaAte[id(pool)] > agora,
+            "pool": pool.estatisticas(),
+        } for pool in self.pools]
+
+
+_roteador = None
+_roteadorPid = None
+_roteadorLock = threading.Lock()
+
+
+def getRoteador():
+    global _roteador, _roteadorPid
+    if _roteador is None or _roteadorPid != os.getpid():
+        with _roteadorLock:
+            if _roteador is None or _roteadorPid != os.getpid():
+                # réplicas conectam sob demanda (minconn 0)
+                opcoesPool = dict(DB_POOL, minconn=0)
+                _roteador = RoteadorReplicas(DB_REPLICAS, DB_REPLICAS_OPCOES["tempoEjecao"], **opcoesPool)
+                _roteadorPid = os.getpid()
+    return _roteador
+
+
+# --- "Ler o que escrevi": fixa as leituras no primário logo após uma escrita ---
+
+COOKIE_PRIMARIO = "lerPrimarioAte"
+
+
+def marcaEscrita():
+    """Chamado pelo Db após um commit: o resto da requisição (e as
+    próximas janelaPrimario segundos do mesmo cliente) leem do primário."""
+    if has_request_context():
+        g.lerDoPrimario = True
+        g.escreveuAte = time.time() + DB_REPLICAS_OPCOES["janelaPrimario"]
+
+
+def fixaPrimario():
+    if has_request_context():
+        g.lerDoPrimario = True
+
+
+def lerDoPrimario():
+    return has_request_context() and g.get("lerDoPrimario", False)
+
+
+def registraJanelaPrimario(app):
+    @app.before_request
+    def _leCookiePrimario():
+        try:
+            if float(request.cookies.get(COOKIE_PRIMARIO, 0)) > time.time():
+                g.lerDoPrimario = True
+        except ValueError:
+            pass
+
+    @app.after_request
+    def _gravaCookiePrimario(resposta):
+        escreveuAte = g.get("escreveuAte")
+        if escreveuAte:
+            resposta.set_cookie(COOKIE_PRIMARIO, f"{escreveuAte:.3f}",
+                                max_age=DB_REPLICAS_OPCOES["janelaPrimario"], httponly=True)
+        return resposta
@@ -0,0 +1,58 @@
+# reservas.py
+from flask import jsonify
+
+from config import RESERVAS
+from db import Db
+
+# Reserva as próximas solicitações em aberto (mais antigas primeiro) para o
+# analista. SKIP LOCKED: linhas que outro analista está reservando no mesmo
+# instante são puladas em vez de esperadas, então cada pedido pega linhas
+# diferentes sem fila de locks. Reservas vencidas voltam a ser elegíveis;
+# as do próprio analista são renovadas e contam no total pedido.
+SQL_RESERVA = """
+    WITH proximas AS (
+        SELECT idSolicitacao
+          FROM Solicitacao
+         WHERE desStatus = 'EM ANALISE'
+           AND (datReservaAte IS NULL OR datReservaAte < now() OR codAnalistaCPF = %s)
+         ORDER BY datSolicitacao, idSolicitacao
+         LIMIT %s
+           FOR UPDATE SKIP LOCKED
+    ), reservadas AS (
+        UPDATE Solicitacao s
+           SET codAnalistaCPF = %s,
+               datReservaAte = now() + make_interval(secs => %s)
+          FROM proximas p
+         WHERE s.idSolicitacao = p.idSolicitacao
+        RETURNING s.idSolicitacao, s.codUsuarioCPF, s.idMedicamento, s.datSolicitacao, s.desStatus, s.datReservaAte
+    )
+    SELECT r.idSolicitacao,
+           u.nomUsuario,
+           m.nomMedicamento,
+           to_char(r.datSolicitacao, 'DD/MM/YYYY') as data_formatada,
+           r.desStatus,
+           r.datSolicitacao,
+           r.datReservaAte
+      FROM reservadas r
+      JOIN Usuario u ON r.codUsuarioCPF = u.codUsuarioCPF
+      JOIN Medicamento m ON r.idMedicamento = m.idMedicamento
+     ORDER BY r.datSolicitacao, r.idSolicitacao
+"""
+
+# Condição das rotas de avaliação: só avalia quem tem a reserva, ou
+# qualquer analista se a solicitação não estiver reservada (ou já venceu)
+CONDICAO_RESERVA = "(codAnalistaCPF IS NULL OR datReservaAte IS NULL OR datReservaAte < now() OR codAnalistaCPF = %s)"
+
+
+def reservaProximas(cpfAnalista, quantidade, db=None):
+    """Reserva até `quantidade` solicitações em uma transação (uma ida ao
+    banco). Devolve as linhas reservadas ou a resposta de erro do Db."""
+    quantidade = min(max(int(quantidade), 1), RESERVAS["maxPorPedido"])
+    db = db or Db()
+    try:
+        with db.transaction() as tx:
+            tx.execSql(SQL_RESERVA, (cpfAnalista, quantidade, cpfAnalista, RESERVAS["validadeSeg"]))
+    except Exception:
+        # a Transacao já registrou o erro em db.mensagem
+        return jsonify({"tipo": "ERRO", "mensagem": db.mensagem}), 500
+    return tx.resultado or []
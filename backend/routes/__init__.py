@@ -1,2 +1,3 @@
 from .login_routes import login_bp
 from .cargo_routes import cargo_bp
+from .metricas_routes import metricas_bp
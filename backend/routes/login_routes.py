@@ -1,10 +1,15 @@
 # routes/login_routes.py
 from flask import Blueprint, request
-from db import Db, Mode
+from db import Db
 from valida import Valida
+from prazos import prazo
 import util
+import logging
 
-import bcrypt
+from senhas import FilaSenhasCheia, servicoSenhas
+from sessao import sessoes
+from usuarios import buscaUsuario, cacheUsuarios
+from limitador import cpfRequisicao, ipCliente, limita
 
 # Definindo o blueprint
 login_bp = Blueprint("login_bp", __name__)
@@ -12,43 +17,33 @@ login_bp = Blueprint("login_bp", __name__)
 
 #Validar login (CPF) de acesso do usuario
 @login_bp.route("/loginAcesso/<codUsuarioCPF>", methods=["GET"])
+@limita(("loginIp", ipCliente), ("loginCpf", cpfRequisicao))
+@prazo(1000)
 def get_loginAcesso(codUsuarioCPF):
     valida = Valida()
     valida.CPF(codUsuarioCPF)
     if valida.temMensagem():
         return valida.getMensagens()
         
-    sql = """
-        SELECT desSenha,
-               idtAtivo
-          FROM Usuario
-         WHERE codUsuarioCPF = %s
-    """
-    params = (codUsuarioCPF,)
-
-    db = Db()
-    try:
-        usuarios = db.execSql(sql, params, Mode.SELECT)
-    except Exception as e:
-        return db.getErro(e)
+    usuario = buscaUsuario(codUsuarioCPF)
+    if isinstance(usuario, tuple):
+        return usuario
         
-    if len(usuarios) == 0:
+    if usuario is None:
         return util.formataAviso("Usuario não encontrado!")
     
-    usuario = usuarios[0]
-    desSenha = usuario[0]
-    idtAtivo = usuario[1]
-    
-    if not idtAtivo:
+    if not usuario.idtAtivo:
         return util.formataAviso("Usuario não está ativo!")
     
-    idtTemSenha = desSenha is not None
+    idtTemSenha = usuario.desSenha is not None
 
     return {"idtTemSenha": idtTemSenha}
   
 
 #Validar senha de acesso do usuario
 @login_bp.route("/loginAcesso", methods=["POST"])
+@limita(("loginIp", ipCliente), ("loginCpf", cpfRequisicao))
+@prazo(2000)
 def post_login_acesso():
     data = request.json
     codUsuarioCPF = data.get("codUsuarioCPF")
@@ -60,50 +55,113 @@ def post_login_acesso():
     if valida.temMensagem():
         return valida.getMensagens()
 
-    sql = """
-        SELECT nomUsuario,
-               desSenha,
-               idtPapel,
-               idtAtivo
-          FROM Usuario
-         WHERE codUsuarioCPF = %s
-    """
-    params = (codUsuarioCPF,)
-    db = Db()
-    try:
-        resultado = db.execSql(sql, params, Mode.SELECT)
-    except Exception as e:
-        return db.getErro(e)
+    usuario = buscaUsuario(codUsuarioCPF)
+    if isinstance(usuario, tuple):
+        return usuario
 
-    if not resultado: 
+    if usuario is None: 
         return util.formataAviso("Usuario não encontrado!")
-    usuario = resultado[0]
-    
-    nomUsuario = usuario[0]
-    desSenha = usuario[1]
-    idtPapel = usuario[2]
-    idtAtivo = usuario[3]
         
-    if not idtAtivo:
+    if not usuario.idtAtivo:
         return util.formataAviso("Usuario não está ativo!")
         
-    if desSenha is not None: 
-        # converte string do banco para bytes
-        if not bcrypt.checkpw(desSenhaInfo.encode('utf-8'), desSenha.encode('utf-8')):
-            return util.formataAviso("Usuário ou senha inválidos!")
+    erro = _verificaSenha(usuario, desSenhaInfo)
+    if erro:
+        return erro
+
+    return [_formataUsuario(usuario)]
+
+
+# Login em uma chamada: com o CPF diz se o usuário precisa informar ou criar
+# a senha; com CPF e senha já autentica. Uma consulta (ou nenhuma, pelo cache).
+@login_bp.route("/login", methods=["POST"])
+@limita(("loginIp", ipCliente), ("loginCpf", cpfRequisicao))
+@prazo(2000)
+def post_login():
+    data = request.json
+    codUsuarioCPF = data.get("codUsuarioCPF")
+    desSenhaInfo = data.get("desSenha")
+
+    valida = Valida()
+    valida.CPF(codUsuarioCPF)
+    if desSenhaInfo is not None:
+        valida.desSenha(desSenhaInfo)
+    if valida.temMensagem():
+        return valida.getMensagens()
+
+    usuario = buscaUsuario(codUsuarioCPF)
+    if isinstance(usuario, tuple):
+        return usuario
 
-    usuario_formatado = []
-    usuario_formatado.append({
-        "codUsuarioCPF" : codUsuarioCPF,
-        "nomUsuario": nomUsuario,
-        "idtPapel": idtPapel,
-    })
+    if usuario is None:
+        return util.formataAviso("Usuario não encontrado!")
+
+    if not usuario.idtAtivo:
+        return util.formataAviso("Usuario não está ativo!")
+
+    if usuario.desSenha is None:
+        # 1o acesso: entra e cadastra a senha em /alterarSenha
+        return {"situacao": "CRIAR_SENHA", "idtTemSenha": False, "usuario": _formataUsuario(usuario)}
 
-    return usuario_formatado
+    if desSenhaInfo is None:
+        return {"situacao": "INFORMAR_SENHA", "idtTemSenha": True}
+
+    erro = _verificaSenha(usuario, desSenhaInfo)
+    if erro:
+        return erro
+
+    return {"situacao": "AUTENTICADO", "idtTemSenha": True, "usuario": _formataUsuario(usuario)}
+
+
+def _verificaSenha(usuario, desSenhaInfo):
+    # devolve a resposta de erro, ou None se a senha confere (ou ainda não existe)
+    if usuario.desSenha is None:
+        return None
+
+    try:
+        senhaOk = servicoSenhas.verifica(desSenhaInfo, usuario.desSenha)
+    except FilaSenhasCheia:
+        return util.formataAviso("Servidor ocupado, tente novamente em instantes.", 'ERRO', 503)
+
+    if not senhaOk:
+        return util.formataAviso("Usuário ou senha inválidos!")
+
+    if servicoSenhas.precisaRehash(usuario.desSenha):
+        _atualizaCustoSenha(usuario.codUsuarioCPF, desSenhaInfo)
+    return None
+
+
+def _formataUsuario(usuario):
+    return {
+        "codUsuarioCPF" : usuario.codUsuarioCPF,
+        "nomUsuario": usuario.nomUsuario,
+        "idtPapel": usuario.idtPapel,
+        "token": sessoes.geraToken(usuario.codUsuarioCPF, usuario.idtPapel),
+    }
+
+
+def _atualizaCustoSenha(codUsuarioCPF, desSenha):
+    # hash com custo antigo: refaz com o custo atual aproveitando a senha já validada
+    try:
+        desSenhaCripto = servicoSenhas.geraHash(desSenha)
+    except FilaSenhasCheia:
+        return  # fica para o próximo login
+
+    sql = """
+        UPDATE Usuario 
+           SET desSenha = %s
+         WHERE codUsuarioCPF = %s
+    """
+    db = Db()
+    db.execSql(sql, (desSenhaCripto, codUsuarioCPF,))
+    cacheUsuarios.invalida(codUsuarioCPF)
+    if db.tipo == "ERRO":
+        logging.error("Falha ao refazer hash da senha de %s: %s", codUsuarioCPF, db.mensagem)
 
 
 # Rota para registrar usuário. A senha é informada somente 1o acesso.
 @login_bp.route("/usuario", methods=["POST"])
+@prazo(2000)
 def post_usuario():
     data = request.json
     codUsuarioCPF = data.get('codUsuarioCPF')
@@ -132,12 +190,15 @@ def post_usuario():
 
     try: 
         db = Db() 
-        return db.execSql(sql, params)
+        resposta = db.execSql(sql, params)
+        cacheUsuarios.invalida(codUsuarioCPF)
+        return resposta
     except Exception as e:
         return db.getErro(e)
 
 # Rota para alterar usuário
 @login_bp.route("/usuario", methods=["PUT"])
+@prazo(2000)
 def put_usuario():
     data = request.json
     codUsuarioCPF    = data.get('codUsuarioCPF')
@@ -155,29 +216,42 @@ def put_usuario():
     if valida.temMensagem():
         return valida.getMensagens()
     
+    # o papel anterior vem do mesmo comando: o CTE enxerga a linha antes do UPDATE
     sql = """
+        WITH anterior AS (
+            SELECT idtPapel FROM Usuario WHERE codUsuarioCPF = %s FOR UPDATE
+        )
         UPDATE Usuario 
            SET nomUsuario = %s,
                desEmail = %s,
                idtPapel = %s,
                idtAtivo = %s
          WHERE codUsuarioCPF = %s
+        RETURNING (SELECT idtPapel FROM anterior)
     """
-    params = (nomUsuario, desEmail, idtPapel, idtAtivo, codUsuarioCPF,)
+    params = (codUsuarioCPF, nomUsuario, desEmail, idtPapel, idtAtivo, codUsuarioCPF,)
 
     db = Db()
     try:
-        resposta = db.execSql(sql, params, )
-        if resposta != '':
-            return resposta
-        
-        return util.formataAviso('Usuário alterado com sucesso')
+        with db.transaction() as tx:
+            tx.execSql(sql, params)
     except Exception as e:
         return db.getErro(e)
 
+    cacheUsuarios.invalida(codUsuarioCPF)
+    if not tx.resultado:
+        return util.formataAviso("Usuario não encontrado!")
+
+    papelAnterior = tx.resultado[0][0]
+    if not idtAtivo or papelAnterior != idtPapel:
+        # usuário desativado ou com outro papel: tokens já emitidos deixam de valer
+        sessoes.revoga(codUsuarioCPF)
+    return util.formataAviso('Usuário alterado com sucesso', 'SUCESSO')
+
          
 # Rota para alterar a senha
 @login_bp.route("/alterarSenha", methods=["PUT"])
+@prazo(2000)
 def put_alterarSenha():
     data = request.json
     codUsuarioCPF = data.get('codUsuarioCPF')
@@ -190,7 +264,10 @@ def put_alterarSenha():
         return valida.getMensagens()
        
     # Gerar hash da senha
-    desSenhaCripto = bcrypt.hashpw(desSenha.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        desSenhaCripto = servicoSenhas.geraHash(desSenha)
+    except FilaSenhasCheia:
+        return util.formataAviso("Servidor ocupado, tente novamente em instantes.", 'ERRO', 503)
 
     sql = """
         UPDATE Usuario 
@@ -200,7 +277,9 @@ def put_alterarSenha():
     params = (desSenhaCripto, codUsuarioCPF,)
     try:
         db = Db()
-        return db.execSql(sql, params)
+        resposta = db.execSql(sql, params)
+        cacheUsuarios.invalida(codUsuarioCPF)
+        return resposta
     except Exception as e:
         return db.getErro(e)
     
\ No newline at end of file
@@ -0,0 +1,54 @@
+# routes/metricas_routes.py
+from flask import Blueprint, request, jsonify
+from metricas import metricasDb
+from pool import getPool
+from replicas import getRoteador
+from limitador import limitadores
+from eventos import getCentral
+from historico import cacheHistorico
+from tarefas import estatisticasFila
+
+metricas_bp = Blueprint("metricas_bp", __name__)
+
+
+# Top-N consultas por tempo total (ou ?ordem=chamadas|maxMs|mediaMs|linhas)
+@metricas_bp.route("/metrics/db", methods=["GET"])
+def get_metricas_db():
+    top = request.args.get("top", 10, type=int)
+    ordem = request.args.get("ordem", "totalMs")
+    if ordem not in ("totalMs", "chamadas", "maxMs", "mediaMs", "linhas", "esperaConexaoMs"):
+        ordem = "totalMs"
+
+    return jsonify({
+        "consultas": metricasDb.top(max(top, 1), ordem),
+        "pool": getPool().estatisticas(),
+        "replicas": getRoteador().estatisticas(),
+        "limiteLentaMs": metricasDb.limiteLentaMs,
+    }), 200
+
+
+# Contadores dos limitadores de requisição (permitidas, recusadas, chaves...)
+@metricas_bp.route("/metrics/limites", methods=["GET"])
+def get_metricas_limites():
+    return jsonify({nome: limitador.estatisticas() for nome, limitador in limitadores.items()}), 200
+
+
+# Assinantes SSE, eventos recebidos do LISTEN, desligados por atraso, resets...
+@metricas_bp.route("/metrics/eventos", methods=["GET"])
+def get_metricas_eventos():
+    return jsonify(getCentral().estatisticas()), 200
+
+
+# Acertos, falhas e invalidações do cache de histórico por CPF
+@metricas_bp.route("/metrics/caches", methods=["GET"])
+def get_metricas_caches():
+    return jsonify({"historico": cacheHistorico.estatisticas()}), 200
+
+
+# Tarefas em segundo plano por tipo e status, e o atraso da pendente mais antiga
+@metricas_bp.route("/metrics/tarefas", methods=["GET"])
+def get_metricas_tarefas():
+    resultado = estatisticasFila()
+    if not isinstance(resultado, dict):
+        return resultado
+    return jsonify(resultado), 200
@@ -1,25 +1,82 @@
-from flask import Blueprint, request, jsonify
+import asyncio
+import hashlib
+import json
+from datetime import date, datetime, timedelta
+from flask import Blueprint, Response, g, request, jsonify
+from werkzeug.exceptions import NotFound, RequestEntityTooLarge
 from db import Db, Mode
+from db_async import DbAsync
+from prazos import prazo
+from usuarios import cacheUsuarios
+from catalogo import catalogo
+from indice import indiceMedicamentos
+from importacao import LeitorMedicamentosCsv, importaMedicamentos
+from reservas import CONDICAO_RESERVA, reservaProximas
+from sessao import exigeSessao, sessoes, tokenNaUrl
+from eventos import getCentral, transmite
+from historico import cacheHistorico
+from documentos import DocumentoInvalido, armazemDocumentos
+from tarefas_solicitacao import CONFERE_DOCUMENTOS, VERIFICA_ELEGIBILIDADE
+from replicas import fixaPrimario
+from config import AVALIACAO, IMPORTACAO, PAGINACAO
+import util
 
 solicitacoes_bp = Blueprint('solicitacoes_bp', __name__)
 
 # --- ROTA 1: LISTAR MEDICAMENTOS ---
 @solicitacoes_bp.route('/medicamentos', methods=['GET'])
+@prazo(1000)
 def obter_medicamentos():
-    db = Db()
-    sql = "SELECT idMedicamento, nomMedicamento, desDosagem FROM Medicamento WHERE idtAtivo = true ORDER BY nomMedicamento"
-    resultados = db.execSql(sql, mode=Mode.SELECT)
-    if resultados is None: return jsonify([]), 200
-    
-    lista = []
-    for row in resultados:
-        lista.append({"id": row[0], "nome": row[1], "dosagem": row[2]})
-    return jsonify(lista), 200
+    # Catálogo já serializado em memória; If-None-Match com o mesmo ETag responde 304
+    corpo, etag = catalogo.obter()
+    if etag is None:
+        return corpo
+
+    resposta = Response(corpo, status=200, mimetype="application/json")
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "no-cache"
+    return resposta.make_conditional(request)
+
+# --- ROTA 1.1: AUTOCOMPLETE DE MEDICAMENTOS ---
+@solicitacoes_bp.route('/medicamentos/busca', methods=['GET'])
+@prazo(500)
+def buscar_medicamentos():
+    # Busca por prefixo no índice em memória; o banco só é lido ao carregar o catálogo
+    corpo, etag = catalogo.obter()
+    if etag is None:
+        return corpo
+
+    try:
+        limite = min(max(int(request.args.get('limite', 10)), 1), 50)
+    except ValueError:
+        return jsonify({"tipo": "ERRO", "mensagem": "Parâmetro 'limite' inválido."}), 400
+
+    return jsonify(indiceMedicamentos.busca(request.args.get('q', ''), limite)), 200
 
 # --- ROTA 2: CRIAR SOLICITAÇÃO (CORRIGIDA) ---
 @solicitacoes_bp.route('/solicitacoes', methods=['POST'])
 def criar_solicitacao():
-    dados = request.json
+    # JSON, ou multipart/form-data com os mesmos campos e os anexos em 'arquivo'.
+    # O upload é lido em fluxo direto para o disco antes do prazo começar a contar:
+    # o prazo vale só para a gravação no banco.
+    if request.mimetype != 'multipart/form-data':
+        return gravaSolicitacao(request.json or {}, [])
+
+    try:
+        form, documentos = armazemDocumentos.recebe(request.environ)
+    except DocumentoInvalido as e:
+        return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 400
+    except RequestEntityTooLarge:
+        return jsonify({"tipo": "ERRO", "mensagem": "Anexos maiores que o permitido."}), 413
+    except ValueError as e:
+        return jsonify({"tipo": "ERRO", "mensagem": f"Formulário inválido: {e}"}), 400
+
+    # se a gravação falhar, os arquivos já publicados ficam para a varredura de
+    # órfãos: outra requisição com o mesmo conteúdo pode estar usando o mesmo arquivo
+    return gravaSolicitacao(form, documentos)
+
+@prazo(2000)
+def gravaSolicitacao(dados, documentos):
     db = Db()
     cpf = dados.get('codUsuarioCPF')
     id_med = dados.get('idMedicamento')
@@ -28,60 +85,251 @@ def criar_solicitacao():
     if not cpf or not id_med:
         return jsonify({"tipo": "ERRO", "mensagem": "Dados incompletos."}), 400
 
+    # Solicitação, documentos e tarefas no mesmo comando (mesma transação)
     sql = """
-        INSERT INTO Solicitacao (codUsuarioCPF, idMedicamento, txtObservacao, desStatus)
-        VALUES (%s, %s, %s, 'EM ANALISE')
-        RETURNING idSolicitacao
+        WITH nova AS (
+            INSERT INTO Solicitacao (codUsuarioCPF, idMedicamento, txtObservacao, desStatus)
+            VALUES (%s, %s, %s, 'EM ANALISE')
+            RETURNING idSolicitacao
+        ), documentos AS (
+            INSERT INTO DocumentoSolicitacao (idSolicitacao, nomArquivo, desCaminho, desTipo, qtdBytes, desHash)
+            SELECT nova.idSolicitacao, d.nome, d.caminho, d.tipo, d.bytes, d.hash
+              FROM nova, unnest(%s::varchar[], %s::varchar[], %s::varchar[], %s::bigint[], %s::varchar[])
+                         AS d(nome, caminho, tipo, bytes, hash)
+        ), tarefas AS (
+            -- trabalho pós-envio vai para a fila (trabalhador.py), não para a resposta
+            INSERT INTO Tarefa (desTipo, jsonDados)
+            SELECT t.tipo, jsonb_build_object('idSolicitacao', nova.idSolicitacao)
+              FROM nova, unnest(%s::varchar[]) AS t(tipo)
+        )
+        SELECT idSolicitacao FROM nova
     """
+    colunas = ("nome", "caminho", "tipo", "bytes", "hash")
+    tipos = [VERIFICA_ELEGIBILIDADE] + ([CONFERE_DOCUMENTOS] if documentos else [])
+    params = (cpf, id_med, obs) + tuple([d[c] for d in documentos] for c in colunas) + (tipos,)
     try:
         # CORREÇÃO AQUI:
         # Usamos Mode.DEFAULT (que faz o commit automático) 
         # E atuIdInsert=True (que captura o ID gerado pelo RETURNING)
-        db.execSql(sql, (cpf, id_med, obs), mode=Mode.DEFAULT, atuIdInsert=True)
+        db.execSql(sql, params, mode=Mode.DEFAULT, atuIdInsert=True)
         
         # Recuperamos o ID salvo na classe Db
         id_gerado = db.getIdInsert()
         
         if not id_gerado:
              return jsonify({"tipo": "ERRO", "mensagem": "Erro ao gravar solicitação."}), 500
-        
-        return jsonify({"tipo": "SUCESSO", "protocolo": id_gerado}), 201
+
+        cacheHistorico.invalida(cpf)
+        return jsonify({"tipo": "SUCESSO", "protocolo": id_gerado, "documentos": len(documentos)}), 201
 
     except Exception as e:
         return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 500
 
+def formataSolicitacao(row):
+    return {
+        "protocolo": row[0],
+        "cidadao": row[1],
+        "medicamento": row[2],
+        "data": row[3],
+        "status": row[4]
+    }
+
+STATUS_SOLICITACAO = ('EM ANALISE', 'DEFERIDO', 'INDEFERIDO')
+
+def filtrosSolicitacao(args):
+    """Condições SQL (e parâmetros) dos filtros da fila. Devolve
+    (condicoes, params, mensagem de erro ou None)."""
+    condicoes = []
+    params = []
+
+    status = args.get('status')
+    if status:
+        if status not in STATUS_SOLICITACAO:
+            return None, None, f"Parâmetro 'status' deve ser um de: {', '.join(STATUS_SOLICITACAO)}."
+        # literal (já validado) e não %s: com o SQL preparado o PostgreSQL só usa o
+        # índice parcial de 'EM ANALISE' se o valor estiver no texto da consulta
+        condicoes.append(f"s.desStatus = '{status}'")
+
+    id_med = args.get('idMedicamento')
+    if id_med:
+        if not id_med.isdigit():
+            return None, None, "Parâmetro 'idMedicamento' inválido."
+        condicoes.append("s.idMedicamento = %s")
+        params.append(int(id_med))
+
+    cpf = args.get('cpf')
+    if cpf:
+        if len(cpf) != 11 or not cpf.isdigit():
+            return None, None, "Parâmetro 'cpf' deve ter 11 dígitos."
+        condicoes.append("s.codUsuarioCPF = %s")
+        params.append(cpf)
+
+    for nome, operador, dias in (('dataInicio', '>=', 0), ('dataFim', '<', 1)):
+        valor = args.get(nome)
+        if not valor:
+            continue
+        try:
+            dia = date.fromisoformat(valor)
+        except ValueError:
+            return None, None, f"Parâmetro '{nome}' deve estar no formato AAAA-MM-DD."
+        # dataFim inclui o dia inteiro: compara com o início do dia seguinte
+        condicoes.append(f"s.datSolicitacao {operador} %s")
+        params.append(dia + timedelta(days=dias))
+
+    return condicoes, params, None
+
+# --- ROTA 2.1: DOCUMENTOS DE UMA SOLICITAÇÃO ---
+@solicitacoes_bp.route('/solicitacoes/<int:id_solicitacao>/documentos', methods=['GET'])
+@prazo(2000)
+@exigeSessao()
+def listar_documentos(id_solicitacao):
+    sql = """
+        SELECT d.idDocumento, d.nomArquivo, d.desTipo, d.qtdBytes, s.codUsuarioCPF
+          FROM DocumentoSolicitacao d
+          JOIN Solicitacao s ON s.idSolicitacao = d.idSolicitacao
+         WHERE d.idSolicitacao = %s
+         ORDER BY d.idDocumento
+    """
+    resultados = Db().execSql(sql, (id_solicitacao,), mode=Mode.SELECT)
+    if not isinstance(resultados, list):
+        return resultados
+
+    sessao = g.sessao
+    if sessao["papel"] not in ('A', 'G') and any(row[4].strip() != sessao["cpf"] for row in resultados):
+        return jsonify({"tipo": "ERRO", "mensagem": "Acesso não permitido a esta solicitação."}), 403
+
+    return jsonify([{"idDocumento": row[0], "nome": row[1], "tipo": row[2], "bytes": row[3]}
+                    for row in resultados]), 200
+
+# --- ROTA 2.2: BAIXAR DOCUMENTO ---
+@solicitacoes_bp.route('/documentos/<int:id_documento>', methods=['GET'])
+@prazo(2000)
+@tokenNaUrl
+@exigeSessao()
+def baixar_documento(id_documento):
+    # Sessão validada pelo token (sem banco) e dados do documento em memória após o
+    # primeiro acesso: as requisições Range seguintes não consultam o banco
+    registro = armazemDocumentos.busca(id_documento)
+    if isinstance(registro, tuple):
+        return registro
+    if registro is None:
+        return jsonify({"tipo": "ERRO", "mensagem": "Documento não encontrado."}), 404
+
+    sessao = g.sessao
+    if sessao["papel"] not in ('A', 'G') and sessao["cpf"] != registro.codUsuarioCPF:
+        return jsonify({"tipo": "ERRO", "mensagem": "Acesso não permitido a este documento."}), 403
+
+    try:
+        return armazemDocumentos.envia(registro)
+    except NotFound:
+        return jsonify({"tipo": "ERRO", "mensagem": "Arquivo do documento não encontrado."}), 404
+
 # --- ROTA 3: LISTAR FILA ---
 @solicitacoes_bp.route('/listar_solicitacoes', methods=['GET'])
+@prazo(5000)
 def listar_solicitacoes():
+    # Paginação por keyset em (datSolicitacao, idSolicitacao): cada página é uma
+    # busca no índice a partir do cursor, então a página 1000 custa o mesmo que a 1ª.
+    # O corpo continua sendo a lista; o token da próxima página vem no header X-Proximo-Cursor.
+    # Filtros: ?status=, ?idMedicamento=, ?dataInicio=/?dataFim= (AAAA-MM-DD) e ?cpf=.
+    try:
+        limite = min(max(int(request.args.get('limite', PAGINACAO["tamanhoPadrao"])), 1),
+                     PAGINACAO["tamanhoMaximo"])
+    except ValueError:
+        return jsonify({"tipo": "ERRO", "mensagem": "Parâmetro 'limite' inválido."}), 400
+
+    condicoes, params, erro = filtrosSolicitacao(request.args)
+    if erro:
+        return jsonify({"tipo": "ERRO", "mensagem": erro}), 400
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            data, id_solicitacao = util.decodificaCursor(cursor)
+            datetime.fromisoformat(data)
+            int(id_solicitacao)
+        except (ValueError, TypeError):
+            return jsonify({"tipo": "ERRO", "mensagem": "Parâmetro 'cursor' inválido."}), 400
+        condicoes.append("(s.datSolicitacao, s.idSolicitacao) < (%s::timestamp, %s)")
+        params.extend([data, id_solicitacao])
+
     db = Db()
-    sql = """
+    sql = f"""
         SELECT 
             s.idSolicitacao, 
             u.nomUsuario, 
             m.nomMedicamento, 
             to_char(s.datSolicitacao, 'DD/MM/YYYY') as data_formatada,
-            s.desStatus
+            s.desStatus,
+            s.datSolicitacao
         FROM Solicitacao s
         JOIN Usuario u ON s.codUsuarioCPF = u.codUsuarioCPF
         JOIN Medicamento m ON s.idMedicamento = m.idMedicamento
-        ORDER BY s.datSolicitacao DESC
+        {"WHERE " + " AND ".join(condicoes) if condicoes else ""}
+        ORDER BY s.datSolicitacao DESC, s.idSolicitacao DESC
+        LIMIT %s
     """
-    resultados = db.execSql(sql, mode=Mode.SELECT)
-    if resultados is None: return jsonify([]), 200
-        
-    lista = []
-    for row in resultados:
-        lista.append({
-            "protocolo": row[0],
-            "cidadao": row[1],
-            "medicamento": row[2],
-            "data": row[3],
-            "status": row[4]
-        })
-    return jsonify(lista), 200
+    # uma linha a mais só para saber se existe próxima página
+    resultados = db.execSql(sql, tuple(params) + (limite + 1,), mode=Mode.SELECT)
+    if not isinstance(resultados, list):
+        return resultados
+
+    pagina = resultados[:limite]
+    resposta = jsonify([formataSolicitacao(row) for row in pagina])
+    if len(resultados) > limite:
+        ultima = pagina[-1]
+        resposta.headers["X-Proximo-Cursor"] = util.codificaCursor(ultima[5].isoformat(), ultima[0])
+    return resposta, 200
+
+# --- ROTA 3.1: RESERVAR PRÓXIMAS DA FILA (Analista) ---
+@solicitacoes_bp.route('/solicitacoes/reservar', methods=['POST'])
+@prazo(2000)
+@exigeSessao('A', 'G')
+def reservar_solicitacoes():
+    # Cada analista recebe solicitações diferentes (FOR UPDATE SKIP LOCKED);
+    # a reserva vence em RESERVAS["validadeSeg"] e a solicitação volta para a fila
+    dados = request.get_json(silent=True) or {}
+    try:
+        quantidade = int(dados.get('quantidade', 10))
+    except (TypeError, ValueError):
+        return jsonify({"tipo": "ERRO", "mensagem": "Quantidade inválida."}), 400
+
+    resultados = reservaProximas(g.sessao["cpf"], quantidade)
+    if not isinstance(resultados, list):
+        return resultados
+
+    return jsonify([{**formataSolicitacao(row), "reservadaAte": row[6].isoformat()}
+                    for row in resultados]), 200
+
+# --- ROTA 3.2: EVENTOS DA FILA EM TEMPO REAL (SSE) ---
+@solicitacoes_bp.route('/solicitacoes/eventos', methods=['GET'])
+@tokenNaUrl
+@exigeSessao()
+def eventos_solicitacoes():
+    # Sem @prazo: a conexão fica aberta. Cidadão recebe só as próprias solicitações,
+    # analista e gestor todas; cada evento é a solicitação criada ou avaliada (delta).
+    sessao = g.sessao
+    canais = [f"cpf:{sessao['cpf']}"] if sessao["papel"] == 'C' else [f"papel:{sessao['papel']}"]
+
+    ultimo = request.headers.get('Last-Event-ID') or request.args.get('ultimoId')
+    try:
+        ultimo_id = int(ultimo) if ultimo else None
+    except ValueError:
+        return jsonify({"tipo": "ERRO", "mensagem": "Last-Event-ID inválido."}), 400
+
+    central = getCentral()
+    assinante, pendentes = central.assina(canais, ultimo_id)
+    if assinante is None:
+        return jsonify({"tipo": "ERRO", "mensagem": "Muitas conexões de eventos abertas. Tente novamente."}), 503
+
+    resposta = Response(transmite(central, assinante, pendentes), mimetype="text/event-stream")
+    resposta.headers["Cache-Control"] = "no-cache"
+    resposta.headers["X-Accel-Buffering"] = "no"
+    return resposta
 
 # --- ROTA 4: AVALIAR ---
 @solicitacoes_bp.route('/avaliar_solicitacao', methods=['PUT'])
+@prazo(2000)
 def avaliar_solicitacao():
     dados = request.json
     db = Db()
@@ -91,18 +339,127 @@ def avaliar_solicitacao():
     
     if not id_solicitacao or novo_status not in ['DEFERIDO', 'INDEFERIDO']:
         return jsonify({"tipo": "ERRO", "mensagem": "Dados inválidos."}), 400
-        
-    sql = "UPDATE Solicitacao SET desStatus = %s WHERE idSolicitacao = %s"
+
+    # Só avalia se ainda estiver em análise e não reservada por outro analista:
+    # duas avaliações da mesma solicitação não se sobrescrevem mais
+    sessao = g.get("sessao")
+    cpf_analista = sessao["cpf"] if sessao else None
+    sql = f"""
+        UPDATE Solicitacao
+           SET desStatus = %s, codAnalistaCPF = coalesce(%s, codAnalistaCPF), datReservaAte = NULL
+         WHERE idSolicitacao = %s
+           AND desStatus = 'EM ANALISE'
+           AND {CONDICAO_RESERVA}
+        RETURNING codUsuarioCPF
+    """
     
     try:
-        db.execSql(sql, (novo_status, id_solicitacao), mode=Mode.DEFAULT)
-        return jsonify({"tipo": "SUCESSO", "mensagem": "Status atualizado!"}), 200
+        with db.transaction() as tx:
+            tx.execSql(sql, (novo_status, cpf_analista, id_solicitacao, cpf_analista))
+    except Exception as e:
+        return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 500
+
+    if not tx.resultado:
+        return jsonify({"tipo": "ERRO", "mensagem": "Solicitação já avaliada, reservada por outro analista ou inexistente."}), 409
+    cacheHistorico.invalida(tx.resultado[0][0])
+    return jsonify({"tipo": "SUCESSO", "mensagem": "Status atualizado!"}), 200
+
+# --- ROTA 4.1: AVALIAR EM LOTE ---
+@solicitacoes_bp.route('/avaliar_solicitacoes', methods=['PUT'])
+@prazo(5000)
+def avaliar_solicitacoes():
+    # {"avaliacoes": [{"idSolicitacao": 1, "status": "DEFERIDO"}, ...]}
+    # ou {"ids": [1, 2, 3], "status": "DEFERIDO"} para o mesmo status em todas.
+    # Um único UPDATE para o lote inteiro; a resposta traz o resultado de cada id.
+    dados = request.get_json(silent=True) or {}
+    if 'ids' in dados:
+        avaliacoes = [{"idSolicitacao": i, "status": dados.get('status')} for i in dados.get('ids') or []]
+    else:
+        avaliacoes = dados.get('avaliacoes') or []
+
+    if not isinstance(avaliacoes, list) or not avaliacoes:
+        return jsonify({"tipo": "ERRO", "mensagem": "Informe as solicitações a avaliar."}), 400
+    if len(avaliacoes) > AVALIACAO["maxLote"]:
+        return jsonify({"tipo": "ERRO", "mensagem": f"Máximo de {AVALIACAO['maxLote']} solicitações por lote."}), 400
+
+    ids, status = [], []
+    for item in avaliacoes:
+        id_solicitacao = item.get('idSolicitacao') if isinstance(item, dict) else None
+        novo_status = item.get('status') if isinstance(item, dict) else None
+        if isinstance(id_solicitacao, bool) or not isinstance(id_solicitacao, int) or novo_status not in ['DEFERIDO', 'INDEFERIDO']:
+            return jsonify({"tipo": "ERRO", "mensagem": f"Avaliação inválida: {item}"}), 400
+        ids.append(id_solicitacao)
+        status.append(novo_status)
+    if len(set(ids)) != len(ids):
+        return jsonify({"tipo": "ERRO", "mensagem": "Solicitação repetida no lote."}), 400
+
+    # o SELECT final lê o estado anterior ao UPDATE (mesmo snapshot), o que
+    # permite dizer por que uma solicitação não foi atualizada
+    sessao = g.get("sessao")
+    cpf_analista = sessao["cpf"] if sessao else None
+    sql = f"""
+        WITH entrada AS (
+            SELECT * FROM unnest(%s::integer[], %s::varchar[]) WITH ORDINALITY AS e(idSolicitacao, status, ordem)
+        ), atualizadas AS (
+            UPDATE Solicitacao s
+               SET desStatus = e.status, codAnalistaCPF = coalesce(%s, codAnalistaCPF), datReservaAte = NULL
+              FROM entrada e
+             WHERE s.idSolicitacao = e.idSolicitacao
+               AND s.desStatus = 'EM ANALISE'
+               AND {CONDICAO_RESERVA}
+            RETURNING s.idSolicitacao, s.codUsuarioCPF
+        )
+        SELECT e.idSolicitacao,
+               CASE WHEN a.idSolicitacao IS NOT NULL THEN 'ATUALIZADA'
+                    WHEN s.idSolicitacao IS NULL THEN 'NAO_ENCONTRADA'
+                    WHEN s.desStatus <> 'EM ANALISE' THEN 'JA_AVALIADA'
+                    ELSE 'RESERVADA'
+               END AS resultado,
+               CASE WHEN a.idSolicitacao IS NOT NULL THEN e.status ELSE s.desStatus END AS status_atual,
+               a.codUsuarioCPF
+          FROM entrada e
+          LEFT JOIN atualizadas a ON a.idSolicitacao = e.idSolicitacao
+          LEFT JOIN Solicitacao s ON s.idSolicitacao = e.idSolicitacao
+         ORDER BY e.ordem
+    """
+    db = Db()
+    try:
+        with db.transaction() as tx:
+            tx.execSql(sql, (ids, status, cpf_analista, cpf_analista))
     except Exception as e:
         return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 500
 
+    cacheHistorico.invalida(*{row[3] for row in tx.resultado if row[3]})
+    resultados = [{"idSolicitacao": row[0], "resultado": row[1], "status": row[2]} for row in tx.resultado]
+    atualizadas = sum(1 for r in resultados if r["resultado"] == 'ATUALIZADA')
+    tipo = "SUCESSO" if atualizadas == len(resultados) else "AVISO"
+    return jsonify({"tipo": tipo,
+                    "mensagem": [f"{atualizadas} de {len(resultados)} solicitações atualizadas."],
+                    "resultados": resultados}), 200
+
 # --- ROTA 5: MEUS PEDIDOS (Para o Cidadão) ---
 @solicitacoes_bp.route('/minhas_solicitacoes/<cpf>', methods=['GET'])
+@prazo(2000)
 def listar_minhas_solicitacoes(cpf):
+    # Histórico serializado em cache por CPF; criar e avaliar invalidam o CPF afetado
+    cpf = cpf.strip()
+    item = cacheHistorico.obter(cpf)
+    if item is None:
+        item = carregaHistorico(cpf)
+        if not isinstance(item[1], str):
+            return item
+
+    corpo, etag = item
+    resposta = Response(corpo, status=200, mimetype="application/json")
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "no-cache"
+    return resposta.make_conditional(request)
+
+def carregaHistorico(cpf):
+    """(corpo, etag) do histórico lido do banco, ou a resposta de erro do Db."""
+    marca = cacheHistorico.marca()
+    # réplica atrasada gravaria no cache um histórico sem a última avaliação
+    fixaPrimario()
     db = Db()
     # Filtra pelo CPF que veio na URL
     sql = """
@@ -117,9 +474,8 @@ def listar_minhas_solicitacoes(cpf):
         ORDER BY s.datSolicitacao DESC
     """
     resultados = db.execSql(sql, (cpf,), mode=Mode.SELECT)
-    
-    if resultados is None:
-        return jsonify([]), 200
+    if not isinstance(resultados, list):
+        return resultados
         
     lista = []
     for row in resultados:
@@ -129,11 +485,15 @@ def listar_minhas_solicitacoes(cpf):
             "data": row[2],
             "status": row[3]
         })
-        
-    return jsonify(lista), 200
+
+    corpo = json.dumps(lista, ensure_ascii=False).encode("utf-8")
+    etag = hashlib.sha1(corpo).hexdigest()
+    cacheHistorico.guarda(cpf, corpo, etag, marca)
+    return corpo, etag
 
 # --- ROTA 6: CADASTRAR MEDICAMENTO (Para Gestor/Func) ---
 @solicitacoes_bp.route('/medicamentos', methods=['POST'])
+@prazo(2000)
 def cadastrar_medicamento():
     dados = request.json
     db = Db()
@@ -144,51 +504,98 @@ def cadastrar_medicamento():
     if not nome or not dosagem:
         return jsonify({"tipo": "ERRO", "mensagem": "Nome e dosagem são obrigatórios."}), 400
         
-    sql = "INSERT INTO Medicamento (nomMedicamento, desDosagem, idtAtivo) VALUES (%s, %s, true)"
+    sql = "INSERT INTO Medicamento (nomMedicamento, desDosagem, idtAtivo) VALUES (%s, %s, true) RETURNING idMedicamento"
     
     try:
-        db.execSql(sql, (nome, dosagem), mode=Mode.DEFAULT)
+        resposta = db.execSql(sql, (nome, dosagem), mode=Mode.DEFAULT, atuIdInsert=True)
+        if db.tipo == "ERRO":
+            return resposta
+        catalogo.adiciona({"id": db.getIdInsert(), "nome": nome, "dosagem": dosagem})
         return jsonify({"tipo": "SUCESSO", "mensagem": "Medicamento cadastrado!"}), 201
     except Exception as e:
         return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 500
 
+# --- ROTA 6.1: IMPORTAR MEDICAMENTOS (CSV) ---
+@solicitacoes_bp.route('/medicamentos/importar', methods=['POST'])
+@prazo(IMPORTACAO["prazoMs"])
+def importar_medicamentos():
+    # CSV "nome,dosagem" como campo 'arquivo' (multipart) ou no corpo (text/csv),
+    # lido em fluxo até o COPY: a memória usada não depende do tamanho do arquivo
+    arquivo = request.files.get('arquivo')
+    leitor = LeitorMedicamentosCsv(arquivo.stream if arquivo else request.stream, IMPORTACAO["maxErros"])
+
+    resumo = importaMedicamentos(leitor)
+    if not isinstance(resumo, dict):
+        return resumo
+
+    if resumo["inseridos"] or resumo["reativados"]:
+        catalogo.invalida()
+
+    if resumo["validas"] == 0:
+        return jsonify({"tipo": "ERRO", "mensagem": ["Nenhuma linha válida no arquivo."], **resumo}), 400
+    if resumo["qtdErros"]:
+        return jsonify({"tipo": "AVISO", "mensagem": ["Importação concluída com erros em algumas linhas."], **resumo}), 200
+    return jsonify({"tipo": "SUCESSO", "mensagem": ["Importação concluída."], **resumo}), 200
+
 # --- ROTA 7: EXCLUIR MEDICAMENTO ---
 @solicitacoes_bp.route('/medicamentos/<int:id_med>', methods=['DELETE'])
+@prazo(2000)
 def excluir_medicamento(id_med):
     db = Db()
     
-    # Verifica se já existe solicitação com esse remédio (Integridade Referencial)
-    sql_check = "SELECT count(*) FROM Solicitacao WHERE idMedicamento = %s"
-    res = db.execSql(sql_check, (id_med,), mode=Mode.SELECT)
-    
-    if res and res[0][0] > 0:
-        # Se já foi usado, não deletamos, apenas inativamos (Soft Delete)
-        sql_inativa = "UPDATE Medicamento SET idtAtivo = false WHERE idMedicamento = %s"
-        db.execSql(sql_inativa, (id_med,), mode=Mode.DEFAULT)
-        return jsonify({"tipo": "SUCESSO", "mensagem": "Medicamento inativado (já possui uso)."}), 200
-    
-    # Se nunca foi usado, pode excluir de verdade
-    sql_delete = "DELETE FROM Medicamento WHERE idMedicamento = %s"
+    # Se já existe solicitação com esse remédio (Integridade Referencial) não deletamos,
+    # apenas inativamos (Soft Delete). Verificação e alteração vão em um único comando.
+    sql = """
+        WITH uso AS (
+            SELECT EXISTS (SELECT 1 FROM Solicitacao WHERE idMedicamento = %s) AS usado
+        ), inativado AS (
+            UPDATE Medicamento SET idtAtivo = false
+             WHERE idMedicamento = %s AND (SELECT usado FROM uso)
+            RETURNING 'INATIVADO'::text AS acao
+        ), excluido AS (
+            DELETE FROM Medicamento
+             WHERE idMedicamento = %s AND NOT (SELECT usado FROM uso)
+            RETURNING 'EXCLUIDO'::text AS acao
+        )
+        SELECT acao FROM inativado
+        UNION ALL
+        SELECT acao FROM excluido
+    """
     try:
-        db.execSql(sql_delete, (id_med,), mode=Mode.DEFAULT)
-        return jsonify({"tipo": "SUCESSO", "mensagem": "Medicamento excluído!"}), 200
+        with db.transaction() as tx:
+            tx.execSql(sql, (id_med, id_med, id_med))
     except Exception as e:
         return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 500
+
+    acao = tx.resultado[0][0] if tx.resultado else None
+    if acao:
+        catalogo.remove(id_med)
+    if acao == 'INATIVADO':
+        return jsonify({"tipo": "SUCESSO", "mensagem": "Medicamento inativado (já possui uso)."}), 200
+    if acao == 'EXCLUIDO':
+        return jsonify({"tipo": "SUCESSO", "mensagem": "Medicamento excluído!"}), 200
+    return jsonify({"tipo": "ERRO", "mensagem": "Medicamento não encontrado."}), 404
     
 
 # --- ROTA 8: DADOS DO DASHBOARD (Para o Gestor) ---
 @solicitacoes_bp.route('/dashboard/resumo', methods=['GET'])
-def dashboard_resumo():
-    db = Db()
-    
+@prazo(3000)
+async def dashboard_resumo():
     # Conta total de solicitações
     sql_total = "SELECT COUNT(*) FROM Solicitacao"
-    res_total = db.execSql(sql_total, mode=Mode.SELECT)
-    total = res_total[0][0] if res_total else 0
     
     # Conta por status (Agrupamento)
     sql_status = "SELECT desStatus, COUNT(*) FROM Solicitacao GROUP BY desStatus"
-    res_status = db.execSql(sql_status, mode=Mode.SELECT)
+
+    # As duas contagens são independentes: rodam ao mesmo tempo, cada uma em sua conexão
+    res_total, res_status = await asyncio.gather(
+        DbAsync().execSql(sql_total, mode=Mode.SELECT),
+        DbAsync().execSql(sql_status, mode=Mode.SELECT))
+    for res in (res_total, res_status):
+        if isinstance(res, tuple):
+            return res
+
+    total = res_total[0][0] if res_total else 0
     
     # Formata para facilitar no frontend
     # Ex: {'EM ANALISE': 5, 'DEFERIDO': 10, ...}
@@ -204,8 +611,59 @@ def dashboard_resumo():
         "indeferidos": dados_status.get('INDEFERIDO', 0)
     }), 200
 
+# --- ROTA 8.1: PAINEL DO CIDADÃO (histórico + catálogo em uma chamada) ---
+@solicitacoes_bp.route('/painel_cidadao/<cpf>', methods=['GET'])
+@prazo(2000)
+async def painel_cidadao(cpf):
+    sql_historico = """
+        SELECT 
+            s.idSolicitacao, 
+            m.nomMedicamento, 
+            to_char(s.datSolicitacao, 'DD/MM/YYYY') as data_formatada,
+            s.desStatus
+        FROM Solicitacao s
+        JOIN Medicamento m ON s.idMedicamento = m.idMedicamento
+        WHERE s.codUsuarioCPF = %s
+        ORDER BY s.datSolicitacao DESC
+    """
+    sql_catalogo = "SELECT idMedicamento, nomMedicamento, desDosagem FROM Medicamento WHERE idtAtivo = true ORDER BY nomMedicamento"
+
+    historico, catalogo = await asyncio.gather(
+        DbAsync().execSql(sql_historico, (cpf,), mode=Mode.SELECT),
+        DbAsync().execSql(sql_catalogo, mode=Mode.SELECT))
+    for res in (historico, catalogo):
+        if isinstance(res, tuple):
+            return res
+
+    return jsonify({
+        "solicitacoes": [
+            {"protocolo": row[0], "medicamento": row[1], "data": row[2], "status": row[3]}
+            for row in historico
+        ],
+        "medicamentos": [
+            {"id": row[0], "nome": row[1], "dosagem": row[2]}
+            for row in catalogo
+        ]
+    }), 200
+
+def formataUsuario(row):
+    papel = "Cidadão"
+    if row[3] == 'A': papel = "Analista"
+    elif row[3] == 'G': papel = "Gestor"
+    elif row[3] == 'F': papel = "Funcionário"
+
+    return {
+        "cpf": row[0].strip(),
+        "nome": row[1],
+        "email": row[2],
+        "papel": row[3], # A, G, C...
+        "papel_nome": papel,
+        "ativo": row[4]
+    }
+
 # --- ROTA 9: LISTAR USUÁRIOS (Para o Gestor) ---
 @solicitacoes_bp.route('/usuarios', methods=['GET'])
+@prazo(5000)
 def listar_usuarios():
     db = Db()
     # Trazemos o nome do papel para ficar bonito na tela
@@ -214,28 +672,15 @@ def listar_usuarios():
         FROM Usuario 
         ORDER BY nomUsuario
     """
-    resultados = db.execSql(sql, mode=Mode.SELECT)
-    if resultados is None: return jsonify([]), 200
-    
-    lista = []
-    for row in resultados:
-        papel = "Cidadão"
-        if row[3] == 'A': papel = "Analista"
-        elif row[3] == 'G': papel = "Gestor"
-        elif row[3] == 'F': papel = "Funcionário"
-        
-        lista.append({
-            "cpf": row[0].strip(),
-            "nome": row[1],
-            "email": row[2],
-            "papel": row[3], # A, G, C...
-            "papel_nome": papel,
-            "ativo": row[4]
-        })
-    return jsonify(lista), 200
+    resultados = db.execSql(sql, mode=Mode.STREAM)
+    if isinstance(resultados, tuple):
+        return resultados
+
+    return util.respostaJsonStream(resultados, formataUsuario)
 
 # --- ROTA 10: CADASTRAR/EDITAR USUÁRIO ---
 @solicitacoes_bp.route('/usuarios', methods=['POST'])
+@prazo(2000)
 def salvar_usuario():
     dados = request.json
     db = Db()
@@ -248,22 +693,32 @@ def salvar_usuario():
     if not cpf or not nome or not papel:
         return jsonify({"tipo": "ERRO", "mensagem": "CPF, Nome e Papel são obrigatórios."}), 400
 
-    # Verifica se já existe
-    sql_check = "SELECT count(*) FROM Usuario WHERE codUsuarioCPF = %s"
-    res = db.execSql(sql_check, (cpf,), mode=Mode.SELECT)
-    
-    if res[0][0] > 0:
-        # UPDATE (Se já existe, atualiza dados, mas NÃO mexe na senha)
-        sql = "UPDATE Usuario SET nomUsuario=%s, desEmail=%s, idtPapel=%s WHERE codUsuarioCPF=%s"
-        params = (nome, email, papel, cpf)
-    else:
-        # INSERT (Novo usuário SEM SENHA)
-        # Passamos None no lugar da senha para ficar NULL no banco
-        sql = "INSERT INTO Usuario (codUsuarioCPF, nomUsuario, desEmail, idtPapel, idtAtivo, desSenha) VALUES (%s, %s, %s, %s, true, %s)"
-        params = (cpf, nome, email, papel, None)
+    # INSERT (Novo usuário SEM SENHA) ou UPDATE se já existe, em um único comando.
+    # No UPDATE os dados são atualizados, mas NÃO mexe na senha
+    # RETURNING devolve o papel anterior (NULL se o usuário é novo): o CTE
+    # enxerga a linha antes do comando
+    sql = """
+        WITH anterior AS (
+            SELECT idtPapel FROM Usuario WHERE codUsuarioCPF = %s
+        )
+        INSERT INTO Usuario (codUsuarioCPF, nomUsuario, desEmail, idtPapel, idtAtivo, desSenha)
+        VALUES (%s, %s, %s, %s, true, NULL)
+        ON CONFLICT (codUsuarioCPF) DO UPDATE
+           SET nomUsuario = EXCLUDED.nomUsuario,
+               desEmail = EXCLUDED.desEmail,
+               idtPapel = EXCLUDED.idtPapel
+        RETURNING (SELECT idtPapel FROM anterior)
+    """
+    params = (cpf, cpf, nome, email, papel)
     
     try:
-        db.execSql(sql, params, mode=Mode.DEFAULT)
+        with db.transaction() as tx:
+            tx.execSql(sql, params)
+        cacheUsuarios.invalida(cpf)
+        papelAnterior = tx.resultado[0][0] if tx.resultado else None
+        if papelAnterior is not None and papelAnterior != papel:
+            # papel mudou: o token antigo ainda diria o papel anterior
+            sessoes.revoga(cpf)
         return jsonify({"tipo": "SUCESSO", "mensagem": "Usuário salvo com sucesso!"}), 200
     except Exception as e:
-        return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 500
\ No newline at end of file
+        return jsonify({"tipo": "ERRO", "mensagem": str(e)}), 500
@@ -0,0 +1,73 @@
+# senhas.py
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import bcrypt
+from config import SENHAS
+
+
+class FilaSenhasCheia(Exception):
+    """Há hashes de senha demais pendentes; a requisição deve ser recusada."""
+
+
+def _hashpw(senha: bytes, custo: int) -> bytes:
+    return bcrypt.hashpw(senha, bcrypt.gensalt(rounds=custo))
+
+
+def _checkpw(senha: bytes, hashed: bytes) -> bool:
+    return bcrypt.checkpw(senha, hashed)
+
+
+"""
+    Executa o bcrypt (caro em CPU) em um pool dedicado, com fila limitada.
+
+    Em modo "thread" o bcrypt libera o GIL, então os hashes rodam em
+    paralelo sem travar as outras rotas; em modo "process" cada hash roda
+    em um processo à parte. Quando maxFila hashes estão pendentes, novas
+    chamadas falham na hora com FilaSenhasCheia em vez de enfileirar.
+    """
+class ServicoSenhas:
+    def __init__(self, executor="thread", trabalhadores=None, maxFila=64, custo=12):
+        self.custo = custo
+        self.trabalhadores = trabalhadores or os.cpu_count() or 1
+        self._classeExecutor = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        self._executor = None
+        self._executorPid = None
+        self._lock = threading.Lock()
+        self._vagas = threading.BoundedSemaphore(maxFila)
+
+    def geraHash(self, senha: str) -> str:
+        return self._executa(_hashpw, senha.encode('utf-8'), self.custo).decode('utf-8')
+
+    def verifica(self, senha: str, hashed: str) -> bool:
+        return self._executa(_checkpw, senha.encode('utf-8'), hashed.encode('utf-8'))
+
+    def precisaRehash(self, hashed: str) -> bool:
+        # formato do bcrypt: $2b$<custo>$<salt+hash>
+        try:
+            return int(hashed.split("$")[2]) != self.custo
+        except (IndexError, ValueError):
+            return False
+
+    def _executa(self, funcao, *args):
+        if not self._vagas.acquire(blocking=False):
+            raise FilaSenhasCheia("Muitas verificações de senha em andamento")
+        try:
+            futuro = self._getExecutor().submit(funcao, *args)
+        except Exception:
+            self._vagas.release()
+            raise
+        futuro.add_done_callback(lambda _: self._vagas.release())
+        return futuro.result()
+
+    def _getExecutor(self):
+        if self._executor is None or self._executorPid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._executorPid != os.getpid():
+                    self._executor = self._classeExecutor(max_workers=self.trabalhadores)
+                    self._executorPid = os.getpid()
+        return self._executor
+
+
+servicoSenhas = ServicoSenhas(**SENHAS)
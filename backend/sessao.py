@@ -0,0 +1,170 @@
+# sessao.py
+import base64
+import collections
+import functools
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+from flask import current_app, g, request, jsonify
+from config import SESSAO
+
+
+class TokenInvalido(Exception):
+    pass
+
+
+def _b64(dados: bytes) -> str:
+    return base64.urlsafe_b64encode(dados).rstrip(b"=").decode("ascii")
+
+
+def _deB64(texto: str) -> bytes:
+    return base64.urlsafe_b64decode(texto + "=" * (-len(texto) % 4))
+
+
+"""
+    Token de sessão compacto: <payload base64url>.<HMAC-SHA256 base64url>.
+    O payload leva CPF (c), papel (p), emissão (i) e expiração (e).
+
+    A verificação não consulta o banco: tokens já verificados ficam em um
+    LRU limitado e a revogação (usuário desativado) é uma lista em memória
+    de CPF -> instante da revogação; tokens emitidos antes dele são
+    recusados. A lista é do processo: com vários workers cada um mantém a
+    sua e a revogação vale onde put_usuario rodou até a expiração natural.
+    """
+class Sessoes:
+    MIN_SEGREDO = 32
+
+    def __init__(self, segredo, validadeSeg=8 * 3600, maxCache=10000):
+        if not segredo or len(segredo) < self.MIN_SEGREDO:
+            # sem segredo próprio qualquer um assinaria tokens de analista/gestor
+            raise RuntimeError(f"Defina a variável de ambiente SEGREDO_SESSAO "
+                               f"(pelo menos {self.MIN_SEGREDO} caracteres aleatórios)")
+        self._segredo = segredo.encode("utf-8")
+        self.validadeSeg = validadeSeg
+        self.maxCache = maxCache
+        self._cache = collections.OrderedDict()   # token -> payload
+        self._revogados = {}                      # cpf -> instante da revogação
+        self._lock = threading.Lock()
+
+    def geraToken(self, cpf, papel):
+        agora = time.time()
+        payload = {"c": cpf.strip(), "p": papel, "i": round(agora, 3), "e": int(agora + self.validadeSeg)}
+        corpo = _b64(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        return f"{corpo}.{self._assina(corpo)}"
+
+    def verifica(self, token):
+        """Devolve o payload do token ou levanta TokenInvalido."""
+        with self._lock:
+            payload = self._cache.get(token)
+            if payload is not None:
+                self._cache.move_to_end(token)
+
+        if payload is None:
+            payload = self._decodifica(token)
+            with self._lock:
+                self._cache[token] = payload
+                if len(self._cache) > self.maxCache:
+                    self._cache.popitem(last=False)
+
+        if payload["e"] < time.time():
+            self._esquece(token)
+            raise TokenInvalido("Sessão expirada")
+
+        revogadoEm = self._revogados.get(payload["c"])
+        if revogadoEm is not None and payload["i"] <= revogadoEm:
+            self._esquece(token)
+            raise TokenInvalido("Sessão revogada")
+
+        return payload
+
+    def revoga(self, cpf):
+        agora = time.time()
+        with self._lock:
+            self._revogados[cpf.strip()] = agora
+            # revogações mais velhas que a validade não barram mais nenhum token
+            limite = agora - self.validadeSeg
+            for chave in [c for c, instante in self._revogados.items() if instante < limite]:
+                del self._revogados[chave]
+
+    def _decodifica(self, token):
+        try:
+            corpo, assinatura = token.split(".")
+        except ValueError:
+            raise TokenInvalido("Token mal formado")
+        if not corpo.isascii():
+            raise TokenInvalido("Token mal formado")
+
+        if not hmac.compare_digest(assinatura, self._assina(corpo)):
+            raise TokenInvalido("Assinatura inválida")
+
+        try:
+            payload = json.loads(_deB64(corpo))
+        except ValueError:
+            raise TokenInvalido("Token mal formado")
+        if not isinstance(payload, dict) or not {"c", "p", "i", "e"} <= payload.keys():
+            raise TokenInvalido("Token mal formado")
+        return payload
+
+    def _assina(self, corpo):
+        return _b64(hmac.new(self._segredo, corpo.encode("ascii"), hashlib.sha256).digest())
+
+    def _esquece(self, token):
+        with self._lock:
+            self._cache.pop(token, None)
+
+
+sessoes = Sessoes(**SESSAO)
+
+
+def registraSessao(app):
+    """Valida o token 'Authorization: Bearer ...' (ou ?token= nas rotas com
+    @tokenNaUrl) em toda requisição e deixa o usuário em g.sessao
+    ({"cpf", "papel"}), ou None sem token."""
+    @app.before_request
+    def _verificaToken():
+        g.sessao = None
+        cabecalho = request.headers.get("Authorization", "")
+        if cabecalho.startswith("Bearer "):
+            token = cabecalho[7:].strip()
+        elif request.args.get("token") and _aceitaTokenNaUrl():
+            token = request.args["token"]
+        else:
+            return None
+
+        try:
+            payload = sessoes.verifica(token)
+        except TokenInvalido as e:
+            return jsonify({"tipo": "ERRO", "mensagem": [str(e)]}), 401
+
+        g.sessao = {"cpf": payload["c"], "papel": payload["p"]}
+        return None
+
+
+def exigeSessao(*papeis):
+    """Rota só para usuários logados (e, se informado, com um dos papéis)."""
+    def decorador(funcao):
+        @functools.wraps(funcao)
+        def envolve(*args, **kwargs):
+            sessao = g.get("sessao")
+            if sessao is None:
+                return jsonify({"tipo": "ERRO", "mensagem": ["Sessão não informada"]}), 401
+            if papeis and sessao["papel"] not in papeis:
+                return jsonify({"tipo": "ERRO", "mensagem": ["Acesso não permitido para este papel"]}), 403
+            return funcao(*args, **kwargs)
+        return envolve
+    return decorador
+
+
+def tokenNaUrl(funcao):
+    """Rota que também aceita o token em ?token=, para quem não consegue
+    enviar cabeçalhos (EventSource, link de PDF aberto pelo navegador)."""
+    funcao.tokenNaUrl = True
+    return funcao
+
+
+def _aceitaTokenNaUrl():
+    view = current_app.view_functions.get(request.endpoint)
+    return getattr(view, "tokenNaUrl", False)
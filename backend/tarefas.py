@@ -0,0 +1,264 @@
+# tarefas.py
+import collections
+import functools
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from db import Db, Mode
+
+# Enfileirar é um INSERT INTO Tarefa no mesmo comando/transação de quem gera
+# o trabalho (ver gravaSolicitacao): a tarefa só existe se ele fizer commit.
+
+# tipo -> função que executa a tarefa (recebe o jsonDados como dict)
+_executores = {}
+
+
+def registra(tipo):
+    """Decorador: associa a função ao tipo de tarefa. A função deve ser de
+    módulo (o pool de processos a envia por referência) e idempotente: uma
+    tarefa cujo lease venceu pode rodar de novo."""
+    def decorador(funcao):
+        _executores[tipo] = funcao
+        return funcao
+    return decorador
+
+
+# Pega até N tarefas do tipo, mais antigas primeiro. SKIP LOCKED: tarefas
+# que outro trabalhador está pegando no mesmo instante são puladas. Ao
+# pegar, datDisponivel passa a ser o fim do lease: se o trabalhador cair,
+# a tarefa volta a ser elegível sozinha quando ele vence. qtdTentativas
+# também serve de marca do lease: só quem tem a tentativa atual conclui.
+SQL_RESERVA = """
+    WITH proximas AS (
+        SELECT idTarefa
+          FROM Tarefa
+         WHERE desTipo = %s
+           AND desStatus IN ('PENDENTE', 'EXECUTANDO')
+           AND datDisponivel <= now()
+         ORDER BY datDisponivel, idTarefa
+         LIMIT %s
+           FOR UPDATE SKIP LOCKED
+    )
+    UPDATE Tarefa t
+       SET desStatus = 'EXECUTANDO',
+           qtdTentativas = t.qtdTentativas + 1,
+           datDisponivel = now() + make_interval(secs => %s)
+      FROM proximas p
+     WHERE t.idTarefa = p.idTarefa
+    RETURNING t.idTarefa, t.jsonDados, t.qtdTentativas
+"""
+
+SQL_CONCLUI = """
+    UPDATE Tarefa
+       SET desStatus = 'CONCLUIDA', datConclusao = now(), txtErro = NULL
+     WHERE idTarefa = %s AND qtdTentativas = %s AND desStatus = 'EXECUTANDO'
+"""
+
+SQL_REAGENDA = """
+    UPDATE Tarefa
+       SET desStatus = 'PENDENTE', datDisponivel = now() + make_interval(secs => %s), txtErro = %s
+     WHERE idTarefa = %s AND qtdTentativas = %s AND desStatus = 'EXECUTANDO'
+"""
+
+SQL_FALHA = """
+    UPDATE Tarefa
+       SET desStatus = 'FALHA', datConclusao = now(), txtErro = %s
+     WHERE idTarefa = %s AND qtdTentativas = %s AND desStatus = 'EXECUTANDO'
+"""
+
+SQL_LIMPA = """
+    DELETE FROM Tarefa
+     WHERE desStatus = 'CONCLUIDA'
+       AND datConclusao < now() - make_interval(secs => %s)
+"""
+
+
+"""
+    Processo trabalhador da fila de tarefas (ver trabalhador.py).
+
+    A cada volta pega, para cada tipo registrado, só as tarefas que cabem
+    nas vagas livres: o limite do tipo (concorrencia) e o total do pool
+    (trabalhadores). Assim uma tarefa nunca espera dentro do pool com o
+    lease correndo, e um tipo lento não ocupa as vagas dos outros. As
+    tarefas rodam em um pool de threads ou de processos; ao terminar, o
+    resultado é gravado pela thread que recebe o retorno.
+
+    Falha com tentativas sobrando volta para PENDENTE com backoff
+    exponencial (com jitter); na última vai para FALHA com o erro. O
+    leaseSeg deve ser maior que a duração de qualquer tarefa: passado
+    esse tempo, outro trabalhador pode pegá-la de novo.
+    """
+class Trabalhador:
+    def __init__(self, executor="thread", trabalhadores=4, intervaloSeg=1.0, leaseSeg=300,
+                 maxTentativas=5, backoffBaseSeg=5, backoffMaxSeg=3600, retencaoSeg=7 * 86400,
+                 tipos=None):
+        self.trabalhadores = trabalhadores
+        self.intervaloSeg = intervaloSeg
+        self.leaseSeg = leaseSeg
+        self.maxTentativas = maxTentativas
+        self.backoffBaseSeg = backoffBaseSeg
+        self.backoffMaxSeg = backoffMaxSeg
+        self.retencaoSeg = retencaoSeg
+        self.tipos = tipos or {}
+        self._classeExecutor = ProcessPoolExecutor if executor == "process" else ThreadPoolExecutor
+        self._emExecucao = collections.Counter()
+        self._metricas = collections.Counter()
+        self._lock = threading.Lock()
+        self._acorda = threading.Event()
+        self._parar = threading.Event()
+        self._periodicas = []   # [próxima execução (monotonic), intervaloSeg, função]
+        self.agenda(3600, self._limpa)
+
+    def roda(self):
+        """Laço principal; volta só depois de para() e das tarefas em
+        andamento terminarem."""
+        logging.info("Trabalhador iniciado: %s", ", ".join(sorted(_executores)))
+        executor = self._classeExecutor(max_workers=self.trabalhadores)
+        try:
+            while not self._parar.is_set():
+                pegas = self._despacha(executor)
+                self._manutencao()
+                if not pegas:
+                    self._acorda.wait(self.intervaloSeg)
+                self._acorda.clear()
+        finally:
+            executor.shutdown(wait=True)
+
+    def para(self):
+        self._parar.set()
+        self._acorda.set()
+
+    def agenda(self, intervaloSeg, funcao):
+        """Roda funcao() no laço principal a cada intervaloSeg: manutenção
+        que não é tarefa da fila (limpeza, varredura de órfãos)."""
+        self._periodicas.append([0, intervaloSeg, funcao])
+
+    def estatisticas(self):
+        with self._lock:
+            return {"emExecucao": dict(self._emExecucao), **self._metricas}
+
+    def _conta(self, nome):
+        with self._lock:
+            self._metricas[nome] += 1
+
+    def _limite(self, tipo, chave):
+        padrao = {"concorrencia": self.trabalhadores, "maxTentativas": self.maxTentativas}
+        return self.tipos.get(tipo, {}).get(chave, padrao[chave])
+
+    def _despacha(self, executor):
+        pegas = 0
+        for tipo in list(_executores):
+            with self._lock:
+                vagas = min(self._limite(tipo, "concorrencia") - self._emExecucao[tipo],
+                            self.trabalhadores - sum(self._emExecucao.values()))
+            if vagas <= 0:
+                continue
+
+            for idTarefa, dados, tentativa in self._reserva(tipo, vagas):
+                pegas += 1
+                if tentativa > self._limite(tipo, "maxTentativas"):
+                    # lease venceu na última tentativa (trabalhador caiu no meio)
+                    self._grava(SQL_FALHA, ("Lease vencido na última tentativa", idTarefa, tentativa))
+                    self._conta("falhas")
+                    continue
+
+                with self._lock:
+                    self._emExecucao[tipo] += 1
+                try:
+                    futuro = executor.submit(_executores[tipo], dados)
+                except Exception:
+                    with self._lock:
+                        self._emExecucao[tipo] -= 1
+                    raise
+                futuro.add_done_callback(functools.partial(self._conclui, tipo, idTarefa, tentativa))
+        return pegas
+
+    def _reserva(self, tipo, quantidade):
+        db = Db()
+        try:
+            with db.transaction() as tx:
+                tx.execSql(SQL_RESERVA, (tipo, quantidade, self.leaseSeg))
+        except Exception:
+            # a Transacao já registrou o erro; tenta de novo na próxima volta
+            self._conta("errosBanco")
+            return []
+        return tx.resultado or []
+
+    def _conclui(self, tipo, idTarefa, tentativa, futuro):
+        erro = futuro.exception()
+        try:
+            if erro is None:
+                self._grava(SQL_CONCLUI, (idTarefa, tentativa))
+                self._conta("concluidas")
+                return
+
+            texto = f"{type(erro).__name__}: {erro}"[:2000]
+            if tentativa >= self._limite(tipo, "maxTentativas"):
+                logging.error("Tarefa %s (%s) falhou de vez na tentativa %s: %s", idTarefa, tipo, tentativa, texto)
+                self._grava(SQL_FALHA, (texto, idTarefa, tentativa))
+                self._conta("falhas")
+            else:
+                espera = min(self.backoffBaseSeg * 2 ** (tentativa - 1), self.backoffMaxSeg)
+                espera *= random.uniform(0.5, 1.0)
+                logging.warning("Tarefa %s (%s) falhou na tentativa %s, nova tentativa em %.0fs: %s",
+                                idTarefa, tipo, tentativa, espera, texto)
+                self._grava(SQL_REAGENDA, (espera, texto, idTarefa, tentativa))
+                self._conta("reagendadas")
+        finally:
+            with self._lock:
+                self._emExecucao[tipo] -= 1
+            # vaga liberada: busca a próxima sem esperar o intervalo
+            self._acorda.set()
+
+    def _grava(self, sql, params):
+        # se a gravação falhar, o lease vence e a tarefa roda de novo
+        db = Db()
+        try:
+            with db.transaction() as tx:
+                tx.execSql(sql, params)
+        except Exception:
+            self._conta("errosBanco")
+
+    def _manutencao(self):
+        agora = time.monotonic()
+        for periodica in self._periodicas:
+            proxima, intervaloSeg, funcao = periodica
+            if agora < proxima:
+                continue
+            periodica[0] = agora + intervaloSeg
+            try:
+                funcao()
+            except Exception:
+                # tenta de novo no próximo intervalo
+                logging.exception("Falha na manutenção periódica %s", getattr(funcao, "__name__", funcao))
+                self._conta("errosManutencao")
+
+    def _limpa(self):
+        self._grava(SQL_LIMPA, (self.retencaoSeg,))
+
+
+def estatisticasFila():
+    """Contagem por tipo e status, e o atraso (segundos) da tarefa pendente
+    mais antiga de cada tipo. Devolve o dict ou a resposta de erro do Db."""
+    sql = """
+        SELECT desTipo,
+               desStatus,
+               count(*),
+               extract(epoch FROM now() - min(datDisponivel)) FILTER (WHERE datDisponivel <= now())
+          FROM Tarefa
+         GROUP BY desTipo, desStatus
+    """
+    resultado = Db().execSql(sql, mode=Mode.SELECT)
+    if not isinstance(resultado, list):
+        return resultado
+
+    fila = {}
+    for tipo, status, quantidade, atraso in resultado:
+        porTipo = fila.setdefault(tipo, {"atrasoSeg": None})
+        porTipo[status] = quantidade
+        if status == "PENDENTE" and atraso is not None:
+            porTipo["atrasoSeg"] = round(float(atraso), 1)
+    return fila
@@ -0,0 +1,84 @@
+# tarefas_solicitacao.py
+import hashlib
+
+from db import Db
+from documentos import armazemDocumentos
+from tarefas import registra
+
+# Enfileiradas por gravaSolicitacao, na mesma transação da solicitação
+VERIFICA_ELEGIBILIDADE = "verifica_elegibilidade"
+CONFERE_DOCUMENTOS = "confere_documentos"
+
+PREFIXO_TRIAGEM = "[Triagem automática]"
+
+
+@registra(VERIFICA_ELEGIBILIDADE)
+def verificaElegibilidade(dados):
+    """Anota na observação o que o analista conferiria à mão: medicamento
+    fora do catálogo ativo e outra solicitação do mesmo cidadão para o
+    mesmo medicamento ainda em análise. Solicitação já avaliada (ou
+    excluída) não é tocada."""
+    idSolicitacao = dados["idSolicitacao"]
+    sql = """
+        SELECT m.idtAtivo,
+               (SELECT min(o.idSolicitacao)
+                  FROM Solicitacao o
+                 WHERE o.codUsuarioCPF = s.codUsuarioCPF
+                   AND o.idMedicamento = s.idMedicamento
+                   AND o.desStatus = 'EM ANALISE'
+                   AND o.idSolicitacao <> s.idSolicitacao)
+          FROM Solicitacao s
+          JOIN Medicamento m ON m.idMedicamento = s.idMedicamento
+         WHERE s.idSolicitacao = %s
+           AND s.desStatus = 'EM ANALISE'
+    """
+    db = Db()
+    with db.transaction() as tx:
+        # consulta no primário: a solicitação acabou de ser criada
+        linhas = tx.consulta(sql, (idSolicitacao,))
+        if not linhas:
+            return
+
+        ativo, outra = linhas[0]
+        avisos = []
+        if ativo is not True:
+            avisos.append("medicamento fora do catálogo ativo")
+        if outra is not None:
+            avisos.append(f"já existe a solicitação {outra} em análise para o mesmo medicamento")
+        if not avisos:
+            return
+
+        # a condição no texto deixa a tarefa idempotente se rodar de novo
+        tx.execSql("""
+            UPDATE Solicitacao
+               SET txtObservacao = concat_ws(E'\\n', nullif(txtObservacao, ''), %s)
+             WHERE idSolicitacao = %s
+               AND desStatus = 'EM ANALISE'
+               AND position(%s IN coalesce(txtObservacao, '')) = 0
+        """, (f"{PREFIXO_TRIAGEM} {'; '.join(avisos).capitalize()}.", idSolicitacao, PREFIXO_TRIAGEM))
+
+
+@registra(CONFERE_DOCUMENTOS)
+def confereDocumentos(dados):
+    """Relê os anexos gravados e confere o SHA-256 com o registrado no
+    upload. Arquivo ausente ou diferente levanta erro: a tarefa é tentada
+    de novo e, persistindo, fica em FALHA para alguém verificar."""
+    sql = "SELECT idDocumento, desCaminho, desHash FROM DocumentoSolicitacao WHERE idSolicitacao = %s"
+    with Db().transaction() as tx:
+        documentos = tx.consulta(sql, (dados["idSolicitacao"],))
+
+    problemas = []
+    for idDocumento, desCaminho, desHash in documentos:
+        hashArquivo = hashlib.sha256()
+        try:
+            with open(armazemDocumentos.caminhoAbsoluto(desCaminho), "rb") as arquivo:
+                for bloco in iter(lambda: arquivo.read(1024 * 1024), b""):
+                    hashArquivo.update(bloco)
+        except FileNotFoundError:
+            problemas.append(f"documento {idDocumento} não encontrado")
+            continue
+        if hashArquivo.hexdigest() != (desHash or "").strip():
+            problemas.append(f"documento {idDocumento} com conteúdo diferente do enviado")
+
+    if problemas:
+        raise RuntimeError("; ".join(problemas))
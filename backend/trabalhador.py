@@ -0,0 +1,35 @@
+# trabalhador.py
+# Processo que executa a fila de tarefas, à parte do servidor web:
+#   python trabalhador.py
+# Pode haver vários (em máquinas diferentes, inclusive): o SKIP LOCKED
+# reparte as tarefas entre eles. SIGTERM/SIGINT param de pegar tarefas
+# novas e esperam as que estão rodando.
+import logging
+import signal
+
+import tarefas_solicitacao  # noqa: F401 (registra os tipos de tarefa)
+from config import TAREFAS
+from documentos import armazemDocumentos
+from tarefas import Trabalhador
+
+
+def varreDocumentos():
+    apagados = armazemDocumentos.varreOrfaos()
+    if apagados:
+        logging.info("Varredura de documentos: %s arquivo(s) órfão(s) apagado(s)", apagados)
+
+
+def main():
+    # na saída padrão, com os avisos de nova tentativa (o Db só grava erros em app.log)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    trabalhador = Trabalhador(**TAREFAS)
+    # arquivos de uploads cuja solicitação não chegou a ser gravada
+    trabalhador.agenda(3600, varreDocumentos)
+    for sinal in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sinal, lambda *_: trabalhador.para())
+    trabalhador.roda()
+    logging.info("Trabalhador encerrado: %s", trabalhador.estatisticas())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+# usuarios.py
+import collections
+import threading
+import time
+
+from config import CACHE_USUARIOS
+from db import Db, Mode
+
+
+class RegistroUsuario:
+    __slots__ = ("codUsuarioCPF", "nomUsuario", "desSenha", "idtPapel", "idtAtivo", "validoAte")
+
+    def __init__(self, codUsuarioCPF, nomUsuario, desSenha, idtPapel, idtAtivo, validoAte):
+        self.codUsuarioCPF = codUsuarioCPF
+        self.nomUsuario = nomUsuario
+        self.desSenha = desSenha
+        self.idtPapel = idtPapel
+        self.idtAtivo = idtAtivo
+        self.validoAte = validoAte
+
+
+"""
+    Cache por CPF dos dados de Usuario usados no login, com TTL e limite
+    de itens (LRU). As rotas que alteram Usuario chamam invalida(cpf).
+    """
+class CacheUsuarios:
+    def __init__(self, ttlSeg=60, maxItens=10000):
+        self.ttlSeg = ttlSeg
+        self.maxItens = maxItens
+        self._itens = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, cpf):
+        with self._lock:
+            registro = self._itens.get(cpf)
+            if registro is None:
+                return None
+            if registro.validoAte < time.monotonic():
+                del self._itens[cpf]
+                return None
+            self._itens.move_to_end(cpf)
+            return registro
+
+    def guarda(self, registro):
+        with self._lock:
+            self._itens[registro.codUsuarioCPF] = registro
+            self._itens.move_to_end(registro.codUsuarioCPF)
+            if len(self._itens) > self.maxItens:
+                self._itens.popitem(last=False)
+
+    def invalida(self, cpf):
+        if not cpf:
+            return
+        with self._lock:
+            self._itens.pop(cpf.strip(), None)
+
+    def limpa(self):
+        with self._lock:
+            self._itens.clear()
+
+
+cacheUsuarios = CacheUsuarios(**CACHE_USUARIOS)
+
+
+def buscaUsuario(codUsuarioCPF):
+    """RegistroUsuario do CPF (do cache ou de uma única consulta), None se
+    não existir, ou a resposta de erro do Db (tupla)."""
+    codUsuarioCPF = codUsuarioCPF.strip()
+    registro = cacheUsuarios.obter(codUsuarioCPF)
+    if registro is not None:
+        return registro
+
+    sql = """
+        SELECT nomUsuario,
+               desSenha,
+               idtPapel,
+               idtAtivo
+          FROM Usuario
+         WHERE codUsuarioCPF = %s
+    """
+    db = Db()
+    resultado = db.execSql(sql, (codUsuarioCPF,), Mode.SELECT)
+    if not isinstance(resultado, list):
+        return resultado
+    if not resultado:
+        return None
+
+    usuario = resultado[0]
+    registro = RegistroUsuario(codUsuarioCPF, usuario[0], usuario[1], usuario[2], usuario[3],
+                               time.monotonic() + cacheUsuarios.ttlSeg)
+    cacheUsuarios.guarda(registro)
+    return registro
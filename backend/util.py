@@ -1,10 +1,74 @@
-from flask import jsonify
+import base64
+import binascii
+import json
+import re
+import unicodedata
+from flask import jsonify, Response
 
-def formataAviso(mensagem, tipo='AVISO'):
-    if tipo == 'SUCESSO':
-       status = 200
-    else:
-       status = 400
+def formataAviso(mensagem, tipo='AVISO', status=None):
+    if status is None:
+       status = 200 if tipo == 'SUCESSO' else 400
 
     msg = {"tipo": tipo, "mensagem":  mensagem if isinstance(mensagem, list) else [mensagem]}
-    return jsonify(msg), status
\ No newline at end of file
+    return jsonify(msg), status
+
+
+def respostaJsonStream(linhas, formata, tamanhoBloco=200):
+    """Devolve um array JSON enviado em partes (chunked) a partir de um
+    gerador de linhas, formatando cada linha com `formata`. A memória
+    usada não depende da quantidade de linhas."""
+    def gera():
+        separador = ""
+        try:
+            yield "["
+            bloco = []
+            for linha in linhas:
+                bloco.append(json.dumps(formata(linha), ensure_ascii=False, default=str))
+                if len(bloco) >= tamanhoBloco:
+                    yield separador + ",".join(bloco)
+                    separador = ","
+                    bloco = []
+            if bloco:
+                yield separador + ",".join(bloco)
+            yield "]"
+        finally:
+            # cliente desconectou ou terminou: libera o cursor/conexão
+            if hasattr(linhas, "close"):
+                linhas.close()
+
+    resposta = Response(gera(), status=200, mimetype="application/json")
+    if hasattr(linhas, "close"):
+        # gera() pode nunca ser iterado (HEAD, cliente que desconectou antes):
+        # o servidor chama o close da resposta de qualquer forma
+        resposta.call_on_close(linhas.close)
+    return resposta
+
+
+def codificaCursor(*valores):
+    """Token opaco de continuação (paginação por keyset) com os valores
+    da última linha da página."""
+    texto = json.dumps(valores, default=str, separators=(",", ":"))
+    return base64.urlsafe_b64encode(texto.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificaCursor(token):
+    """Valores gravados por codificaCursor; ValueError se o token for inválido."""
+    try:
+        texto = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        valores = json.loads(texto)
+    except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError) as e:
+        raise ValueError("Cursor inválido") from e
+    if not isinstance(valores, list):
+        raise ValueError("Cursor inválido")
+    return valores
+
+
+_reSeparador = re.compile(r"[^a-z0-9]+")
+
+
+def normaliza(texto):
+    """Minúsculas, sem acentos e com pontuação virando espaço."""
+    if not texto:
+        return ""
+    semAcento = unicodedata.normalize("NFKD", texto).encode("ascii", "ignore").decode("ascii")
+    return _reSeparador.sub(" ", semAcento.lower()).strip()
@@ -70,6 +70,9 @@ class Valida:
     def idtAtivo(self, idtAtivo):
         if idtAtivo is None:
             self.mensagem.append('Idt Ativo não pode ser nulo!')
+        elif not isinstance(idtAtivo, bool):
+            # "false" (texto) seria verdadeiro no Python e não revogaria a sessão
+            self.mensagem.append(f'Idt Ativo {idtAtivo!r} inválido: deve ser true ou false!')
         
 
     def codCargo(self, codCargo):
@@ -58,14 +58,16 @@ export default function TelaSolicitacao() {
     setLoading(true);
 
     try {
+      // multipart: o anexo vai junto e é gravado na mesma transação da solicitação
+      const formulario = new FormData();
+      formulario.append("codUsuarioCPF", codUsuarioCPF); // Envia o CPF do usuário logado
+      formulario.append("idMedicamento", String(medicamentoSelecionado));
+      formulario.append("observacao", observacao);
+      formulario.append("arquivo", arquivo);
+
       const response = await fetch(`${baseUrl}/api/solicitacoes`, {
         method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          codUsuarioCPF: codUsuarioCPF, // Envia o CPF do usuário logado
-          idMedicamento: medicamentoSelecionado,
-          observacao: observacao,
-        }),
+        body: formulario,
       });
 
       const data = await response.json();
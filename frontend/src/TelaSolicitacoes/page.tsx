@@ -11,6 +11,8 @@ interface Solicitacao {
 
 export default function TelaFilaSolicitacoes() {
   const [solicitacoes, setSolicitacoes] = useState<Solicitacao[]>([]);
+  // A fila vem paginada: o token da próxima página chega no header X-Proximo-Cursor
+  const [proximoCursor, setProximoCursor] = useState<string | null>(null);
   // Estado para controlar qual item está sendo avaliado
   const [itemEmAnalise, setItemEmAnalise] = useState<Solicitacao | null>(null);
 
@@ -18,12 +20,18 @@ export default function TelaFilaSolicitacoes() {
     carregarFila();
   }, []);
 
-  const carregarFila = async () => {
+  // Só as solicitações em aberto (índice parcial no banco), não o histórico já avaliado.
+  // Sem cursor recarrega desde a primeira página; com cursor acrescenta a próxima
+  const carregarFila = async (cursor?: string) => {
     try {
-      const response = await fetch(`${baseUrl}/api/listar_solicitacoes`);
+      const parametros = new URLSearchParams({ status: "EM ANALISE" });
+      if (cursor) parametros.set("cursor", cursor);
+      const url = `${baseUrl}/api/listar_solicitacoes?${parametros}`;
+      const response = await fetch(url);
       if (response.ok) {
-        const data = await response.json();
-        setSolicitacoes(data);
+        const data: Solicitacao[] = await response.json();
+        setSolicitacoes((atuais) => (cursor ? [...atuais, ...data] : data));
+        setProximoCursor(response.headers.get("X-Proximo-Cursor"));
       }
     } catch (error) {
       console.error("Erro ao buscar fila", error);
@@ -111,6 +119,17 @@ export default function TelaFilaSolicitacoes() {
         </table>
       </div>
 
+      {proximoCursor && (
+        <div className="mt-4 text-center">
+          <button
+            onClick={() => carregarFila(proximoCursor)}
+            className="px-4 py-2 text-[#1351B4] border border-[#1351B4] hover:bg-blue-50 rounded-lg font-medium transition"
+          >
+            Carregar mais
+          </button>
+        </div>
+      )}
+
       {/* MODAL DE AVALIAÇÃO */}
       {itemEmAnalise && (
         <div className="fixed inset-0 bg-black bg-opacity-50 flex items-center justify-center z-50">